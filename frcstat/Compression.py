@@ -0,0 +1,53 @@
+"""
+Encoding of cached payloads.
+
+Payloads are stored as JSON, optionally compressed with zlib or lzma (xz container).
+The format is detected from the first bytes when decoding, so plain JSON written by older versions is still read,
+and caches holding a mix of formats work.
+"""
+import json
+import lzma
+import zlib
+
+COMPRESSIONS = (None , "zlib" , "lzma")
+_XZ_MAGIC = b"\xfd7zXZ\x00"
+
+def encodePayload(data , compression = None):
+    """
+        Returns the bytes to store for data
+    """
+    raw = json.dumps(data).encode("utf-8")
+    if compression is None:
+        return raw
+    if compression == "zlib":
+        return zlib.compress(raw , 6)
+    if compression == "lzma":
+        return lzma.compress(raw)
+    raise(Exception("Unknown compression {}".format(compression)))
+
+def getCompression(stored):
+    """
+        Returns which of COMPRESSIONS stored was written with
+    """
+    if isinstance(stored , str):
+        return None
+    if stored[:len(_XZ_MAGIC)] == _XZ_MAGIC:
+        return "lzma"
+    #JSON never starts with 0x78 ("x"), a zlib stream with the default window always does
+    if len(stored) > 1 and stored[0] == 0x78 and ((stored[0] << 8) + stored[1]) % 31 == 0:
+        return "zlib"
+    return None
+
+def decompressPayload(stored):
+    """
+        Returns the raw JSON bytes (or str) of a stored payload, whatever format it was stored in
+    """
+    compression = getCompression(stored)
+    if compression == "lzma":
+        return lzma.decompress(stored)
+    if compression == "zlib":
+        return zlib.decompress(stored)
+    return stored
+
+def decodePayload(stored):
+    return json.loads(decompressPayload(stored))
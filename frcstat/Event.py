@@ -1,14 +1,26 @@
 import re
+import ast
+import json
+import hashlib
 import frcstat.Team as Team
 import numpy as np
 import scipy.linalg as lin
+import scipy.sparse as sparse
+import scipy.sparse.linalg as sparse_linalg
 from copy import copy
 from scipy.special import erfinv
 from collections import defaultdict
 from .ObjectShare import ObjectShare
+from .ValiditySession import ValiditySession
+from .IncrementalOPR import IncrementalOPR
+from .MatchTable import MatchTable, RED, BLUE, BREAKDOWN_PREFIX
 
 _Singleton_TBA_Client = None
 
+DENSE_PATTERN_SIZE = 10000 #scoreMetricFromPattern systems with at most this many entries use the dense pseudo inverse
+DENSE_NORMAL_VARIABLES = 2000 #sparse systems with at most this many variables try a dense cholesky of their normal equations first
+ELIM_ROUNDS = ("ef" , "qf" , "sf" , "f") #getElimStats furthest_round indexes these, len(ELIM_ROUNDS) being the event winners
+
 class Event:
     def __init__(self , code , localDataOnly = 1):
         '''
@@ -41,13 +53,18 @@ class Event:
         self.fetchedAlliances = False
         self.fetchedRankings = False
         self.fetchedMatches = False
+        self.fetchedDistrictPoints = False
+        self.fetchedAwards = False
 
         self.lookup = None
 
         self.qualMatchAmount = None
+        self._derivedCache = {} #Structures derived from matchData and teamList, cleared when either is reloaded
 
         self.validityFile = code + "-valid"
-        self._old_validity_data = None
+        self.validity = ValiditySession(lambda : _Singleton_TBA_Client.readEventData(self.validityFile) ,
+                                        lambda validityData : _Singleton_TBA_Client.writeEventData(self.validityFile , validityData) ,
+                                        lambda : _Singleton_TBA_Client.lockData("events" , self.validityFile))
 
     def getMatchData(self):
         if not self.fetchedMatches:
@@ -62,13 +79,15 @@ class Event:
         return self.rankings
 
     def getDistrictPoints(self):
-        if not self.districtPoints:
+        if not self.fetchedDistrictPoints:
             self.loadDistrictPoints()
+            self.fetchedDistrictPoints = True
         return self.districtPoints
 
     def getAwardsObj(self):
-        if not self.awards:
+        if not self.fetchedAwards:
             self.loadAwards()
+            self.fetchedAwards = True
         return self.awards
 
     def getAlliances(self):
@@ -124,12 +143,7 @@ class Event:
 
     def getQualMatchAmount(self):
         if not self.qualMatchAmount:
-            self.qualMatchAmount = 0
-            matchData = self.getMatchData()
-            for mkey in matchData:
-                m = matchData[mkey]
-                if m["comp_level"] == "qm":
-                    self.qualMatchAmount += 1
+            self.qualMatchAmount = int(np.count_nonzero(self._getMatchTable().table["comp_level"] == "qm"))
         return self.qualMatchAmount
 
     def getYear(self):
@@ -193,64 +207,235 @@ class Event:
         
     def getArrayOPRS(self):
         '''
-            Fast solving for component OPRS using cholesky decomposition
-            Minimal looping, hard coded incrementation 
+            Fast solving for OPRS using cholesky decomposition
+            Normal equations are assembled from the alliance index arrays with bincount, no per match looping
             
             Returns array where teams are looked up by index
         '''
-        lookupDict = self._getLookupDict()
-        totalMatches = self.getQualMatchAmount()
-        A = np.zeros((len(self.getTeamList()) , len(self.getTeamList())))
-        B = np.zeros(len(self.getTeamList()))
-        
-        matchData = self.getMatchData()
-        for m in matchData:
-            if matchData[m]["comp_level"] == "qm":
-                match = matchData[m]
-                RS = match["alliances"]["red"]["score"]
-                BS = match["alliances"]["blue"]["score"]
-                if RS != -1 and BS != -1: #is valid match
-                    R1I = lookupDict[match["alliances"]["red"]["team_keys"][0]]
-                    R2I = lookupDict[match["alliances"]["red"]["team_keys"][1]]
-                    R3I = lookupDict[match["alliances"]["red"]["team_keys"][2]]
-                    B1I = lookupDict[match["alliances"]["blue"]["team_keys"][0]]
-                    B2I = lookupDict[match["alliances"]["blue"]["team_keys"][1]]
-                    B3I = lookupDict[match["alliances"]["blue"]["team_keys"][2]]
-                   
-                    A[R1I][R1I] += 1
-                    A[R1I][R2I] += 1
-                    A[R1I][R3I] += 1
-                    A[R2I][R1I] += 1
-                    A[R2I][R2I] += 1
-                    A[R2I][R3I] += 1
-                    A[R3I][R1I] += 1
-                    A[R3I][R2I] += 1
-                    A[R3I][R3I] += 1
-                    
-                    A[B1I][B1I] += 1
-                    A[B1I][B2I] += 1
-                    A[B1I][B3I] += 1
-                    A[B2I][B1I] += 1
-                    A[B2I][B2I] += 1
-                    A[B2I][B3I] += 1
-                    A[B3I][B1I] += 1
-                    A[B3I][B2I] += 1
-                    A[B3I][B3I] += 1
-
-                    B[R1I] += RS
-                    B[R2I] += RS
-                    B[R3I] += RS
-                    
-                    B[B1I] += BS
-                    B[B2I] += BS
-                    B[B3I] += BS
-        #return lin.cho_solve(lin.cho_factor(A) , B) #lin.cho_solve(lin.cho_factor(A , True , True , False) , B , False)
+        teamAmount = len(self.getTeamList())
+        matchKeys , red , blue , redScore , blueScore = self._getQualAllianceArrays()
+        alliances = np.concatenate((red , blue))
+        scores = np.concatenate((redScore , blueScore))
+        A = self._getAllianceNormalMatrix(alliances , teamAmount)
+        B = np.bincount(alliances.ravel() , weights = np.repeat(scores , 3) , minlength = teamAmount)
+        return self._solveNormalEquations(A , B)
+
+    def _getQualAllianceArrays(self):
+        '''
+            Returns (matchKeys , red , blue , redScore , blueScore) for every played qual match
+                red and blue are (matches , 3) arrays of team indices from _getLookupDict()
+                redScore and blueScore are float arrays
+            Built once per match data and team list
+        '''
+        if "qualAllianceArrays" not in self._derivedCache:
+            matchTable = self._getMatchTable()
+            table = matchTable.table
+            rows = self._getQualRows()
+            red = np.column_stack([table[station][rows] for station in ("R1" , "R2" , "R3")]).reshape(-1 , 3)
+            blue = np.column_stack([table[station][rows] for station in ("B1" , "B2" , "B3")]).reshape(-1 , 3)
+            if (red < 0).any() or (blue < 0).any():
+                raise(Exception("Event {} has a qual match team missing from the team list".format(self.eventCode)))
+            self._derivedCache["qualAllianceArrays"] = ([matchTable.keys[r] for r in rows] , red , blue , table["RS"][rows] , table["BS"][rows])
+        return self._derivedCache["qualAllianceArrays"]
+
+    def _getMatchTable(self):
+        '''
+            Returns the MatchTable (columnar copy) of matchData, built once per match data and team list
+        '''
+        if "matchTable" not in self._derivedCache:
+            self._derivedCache["matchTable"] = MatchTable(self.getMatchData() or {} , self._getLookupDict())
+        return self._derivedCache["matchTable"]
+
+    def _getQualRows(self):
+        '''
+            Returns the match table rows of every played qual match
+        '''
+        table = self._getMatchTable().table
+        return np.flatnonzero((table["comp_level"] == "qm") & (table["RS"] != -1) & (table["BS"] != -1))
+
+    def _getTeamRows(self , team):
+        '''
+            Returns (rows , colors , stations) , the match table rows team played in, the color (RED or BLUE)
+            and alliance station (1 based) it played them at. Served by the match table's team index, O(matches of team)
+        '''
+        return self._getMatchTable().getTeamRows(team)
+
+    def _getAllianceNormalMatrix(self , alliances , teamAmount):
+        '''
+            alliances - (rows , 3) array of team indices
+            Returns the teamAmount x teamAmount matrix counting how often every pair of teams played on an alliance together
+        '''
+        rows = np.repeat(alliances , 3 , axis = 1).ravel()
+        cols = np.tile(alliances , (1 , 3)).ravel()
+        return np.bincount(rows * teamAmount + cols , minlength = teamAmount * teamAmount).reshape(teamAmount , teamAmount).astype(float)
+
+    def _solveNormalEquations(self , A , B):
+        '''
+            Solves A x = B for a symmetric A, B may be a vector or a matrix with one right hand side per column
+            Cholesky is tried first, falling back to a general solve and then least squares when A is singular
+            Columns of B holding NaN or inf can't be solved, their solutions are NaN and the other columns are solved as usual
+        '''
+        finite = np.isfinite(B).all(axis = 0)
+        if not np.all(finite):
+            X = np.full(np.shape(B) , np.nan)
+            if np.ndim(B) == 2 and finite.any():
+                X[: , finite] = self._solveNormalEquations(A , B[: , finite])
+            return X
+        try:
+            return lin.cho_solve(lin.cho_factor(A) , B)
+        except (lin.LinAlgError , ValueError):
+            pass
         try:
             return lin.solve(A , B)
         except:
             #print("LEAST SQUARES SOLUTION USED.")
             return lin.lstsq(A , B)[0]
         
+    def updateOprs(self , matches):
+        '''
+            matches - iterable of TBA match dicts (as returned by event/{key}/matches), typically newly played matches
+
+            Merges the matches into matchData and folds the played qual matches that weren't counted yet into the OPRs
+            with rank 1 updates, O(teams^2) per match instead of rebuilding and solving the whole system.
+            Teams that weren't known yet are added to the end of the team list.
+            If a match that was already counted changed (score correction , replay) the OPRs are rebuilt instead.
+
+            Returns the updated OPR array, where teams are looked up by index
+        '''
+        oldData = self.getMatchData() or {}
+        changed = {}
+        for match in matches:
+            matchKey = match["key"].replace(self.eventCode + "_", "")
+            if oldData.get(matchKey) != match:
+                changed[matchKey] = match
+        if len(changed) == 0:
+            return self._getLiveOprs()
+        matchData = dict(oldData) #the loaded dict may be shared with the client's cache
+        matchData.update(changed)
+        return self._setLiveMatchData(matchData , changed)
+
+    def refreshLiveOprs(self):
+        '''
+            Live scoreboard step: checks TBA for new match data (If-Modified-Since, so usually a 304)
+            and, when it changed, swaps it in and folds any newly played qual matches into the OPRs like updateOprs
+
+            Returns the OPR array, where teams are looked up by index
+        '''
+        job = self._endpointJobs()["matchData"]
+        validityData = self.readValidityData()
+        lastModified = validityData.get(job[0])
+        matchData = _Singleton_TBA_Client.makeSmartRequest(job[0], job[1], validityData, self, 2, job[3])
+        self.writeValidityData(validityData)
+        if self.fetchedMatches and lastModified is not None and validityData.get(job[0]) == lastModified:
+            return self._getLiveOprs() #304, nothing new
+        matchData = matchData or {}
+        oldData = self.getMatchData() or {}
+        changed = [matchKey for matchKey in matchData if oldData.get(matchKey) != matchData[matchKey]]
+        changed += [matchKey for matchKey in oldData if matchKey not in matchData]
+        if len(changed) == 0:
+            return self._getLiveOprs()
+        return self._setLiveMatchData(matchData , changed)
+
+    def _getLiveOprs(self):
+        self.oprs = self._getIncrementalOPR().getOprs()
+        self.fetchedOprs = True
+        return self.oprs
+
+    def _setLiveMatchData(self , matchData , changed):
+        '''
+            matchData - the new matchData
+            changed - keys of the matches that differ from the current matchData (added , changed or removed)
+
+            Swaps in matchData, dropping the derived values that depend on the changed matches.
+            The incremental OPR state is kept only if none of the matches it counted changed what they add to it,
+            otherwise it is rebuilt.
+
+            Returns the OPR array, where teams are looked up by index
+        '''
+        if self.getTeamList() is None: #no team list could be made, teams come from the matches
+            self.teamList = []
+        tracker = self._getIncrementalOPR()
+        oldData = self.getMatchData() or {}
+        lookup = self.getLookup()
+        qualsOnly = True
+        newEntries = []
+        teamsAdded = False
+        for matchKey in changed:
+            oldMatch = oldData.get(matchKey)
+            match = matchData.get(matchKey)
+            if (oldMatch is not None and oldMatch["comp_level"] != "qm") or (match is not None and match["comp_level"] != "qm"):
+                qualsOnly = False
+            entry = _oprEntry(match)
+            if tracker is not None and matchKey in tracker.matchKeys and entry != _oprEntry(oldMatch):
+                tracker = None
+            if entry is None:
+                continue
+            for teamKey in entry[0] + entry[1]:
+                if teamKey not in lookup:
+                    lookup[teamKey] = len(self.teamList)
+                    self.teamList.append(teamKey)
+                    teamsAdded = True
+            newEntries.append((matchKey , entry))
+
+        self.matchData = matchData
+        self.qualMatchAmount = None
+        dropped = ["matchTable" , "qualAllianceArrays" , "incrementalOPR"]
+        if not qualsOnly or teamsAdded:
+            dropped += ["teamElimWins" , "allDistrictPoints" , "allDistrictPointsNoPlayoffs"]
+        if not qualsOnly:
+            dropped += ["elimStats"]
+        for name in dropped:
+            self._derivedCache.pop(name , None)
+
+        if tracker is not None:
+            for teamKey in self.teamList[len(tracker.teamKeys):]:
+                tracker.getTeamIndex(teamKey)
+            for matchKey , entry in newEntries:
+                tracker.addMatch(matchKey , *entry)
+            self._derivedCache["incrementalOPR"] = tracker
+        return self._getLiveOprs()
+
+    def getOPRProgression(self , matchCounts = None):
+        '''
+            OPR after every played qual match, computed in one chronological pass of rank 1 updates
+
+            matchCounts - iterable of amounts of played matches to return the OPRs after, every match by default.
+                          Rows before the system is solvable each cost a least squares solve, leaving them out skips those
+
+            Returns (matchKeys , progression)
+                matchKeys - key of the last match of every row, qual match keys in match number order
+                progression - (rows , teams) array, row i holds the OPRs after matchKeys[i], teams are looked up by index
+                              Until every team has played (and the system is solvable) rows hold the minimum norm
+                              least squares OPRs of the teams that played, NaN for the teams that haven't
+        '''
+        matchKeys , red , blue , redScore , blueScore = self._getQualAllianceArrays()
+        matchNumbers = self._getMatchTable().table["match_number"][self._getQualRows()]
+        order = np.argsort(matchNumbers , kind = "stable")
+        if matchCounts is None:
+            matchCounts = range(1 , len(order) + 1)
+        matchCounts = sorted(set(count for count in matchCounts if 1 <= count <= len(order)))
+
+        tracker = IncrementalOPR(self.getTeamList())
+        progression = np.zeros((len(matchCounts) , len(self.getTeamList())))
+        added = 0
+        for row in range(len(matchCounts)):
+            while added < matchCounts[row]:
+                i = order[added]
+                tracker.addMatchIndices(matchKeys[i] , red[i] , blue[i] , redScore[i] , blueScore[i])
+                added += 1
+            progression[row] = tracker.getOprs()
+        return [matchKeys[order[count - 1]] for count in matchCounts] , progression
+
+    def _getIncrementalOPR(self):
+        '''
+            Returns the IncrementalOPR state of the current match data and team list
+        '''
+        if "incrementalOPR" not in self._derivedCache:
+            tracker = IncrementalOPR(self.getTeamList() or [])
+            tracker.addMatches(*self._getQualAllianceArrays())
+            self._derivedCache["incrementalOPR"] = tracker
+        return self._derivedCache["incrementalOPR"]
+
     def getDictOPRS(self):
         lookupDict = self._getLookupDict()
         oprs = self.getArrayOPRS()
@@ -269,88 +454,56 @@ class Event:
         return out
          
     def getComponentOPRS(self):
-        lookupDict = self._getLookupDict()
-        totalMatches = self.getQualMatchAmount()
-        A = np.zeros((len(self.getTeamList()) , len(self.getTeamList())))
-        BDict = defaultdict(lambda : np.zeros(len(self.getTeamList())))
+        '''
+            Component OPRS for every numeric score_breakdown key
+            A is factored once and solved against all keys at once, one right hand side column per key
+
+            Returns dict of key -> array where teams are looked up by index
+        '''
+        teamAmount = len(self.getTeamList())
+        matchKeys , red , blue , redScore , blueScore = self._getQualAllianceArrays()
+        matchTable = self._getMatchTable()
+        rows = self._getQualRows()
         
+        #Check what keys have associated numeric values in every played qual match
+        table = matchTable.table
         validKeys = []
-        colors = ["red" , "blue"]
-        matchData = self.getMatchData()
-        for m in matchData:
-            if matchData[m]["comp_level"] == "qm":
-                match = matchData[m]
-                RS = match["alliances"]["red"]["score"]
-                BS = match["alliances"]["blue"]["score"]
-                if RS != -1 and BS != -1: #is valid match
-                    R1I = lookupDict[match["alliances"]["red"]["team_keys"][0]]
-                    R2I = lookupDict[match["alliances"]["red"]["team_keys"][1]]
-                    R3I = lookupDict[match["alliances"]["red"]["team_keys"][2]]
-                    B1I = lookupDict[match["alliances"]["blue"]["team_keys"][0]]
-                    B2I = lookupDict[match["alliances"]["blue"]["team_keys"][1]]
-                    B3I = lookupDict[match["alliances"]["blue"]["team_keys"][2]]
-                    
-                    #Check what keys have associated numeric values
-                    if len(validKeys) == 0:
-                        for key in match["score_breakdown"]["red"]:
-                            try:
-                                value = float(match["score_breakdown"]["red"][key])
-                                validKeys.append(key)
-                            except ValueError:
-                                pass
-                                
-                    for key in validKeys:
-                        colorIs = [[R1I , R2I , R3I] , [B1I , B2I , B3I]]
-                        for c in range(2): 
-                            for i in colorIs[c]:
-                                BDict[key][i] += match["score_breakdown"][colors[c]][key]
-                   
-                    A[R1I][R1I] += 1
-                    A[R1I][R2I] += 1
-                    A[R1I][R3I] += 1
-                    A[R2I][R1I] += 1
-                    A[R2I][R2I] += 1
-                    A[R2I][R3I] += 1
-                    A[R3I][R1I] += 1
-                    A[R3I][R2I] += 1
-                    A[R3I][R3I] += 1
-                    
-                    A[B1I][B1I] += 1
-                    A[B1I][B2I] += 1
-                    A[B1I][B3I] += 1
-                    A[B2I][B1I] += 1
-                    A[B2I][B2I] += 1
-                    A[B2I][B3I] += 1
-                    A[B3I][B1I] += 1
-                    A[B3I][B2I] += 1
-                    A[B3I][B3I] += 1
+        if len(matchKeys) > 0:
+            firstBreakdown = self.getMatchData()[matchKeys[0]]["score_breakdown"]["red"]
+            for key in firstBreakdown:
+                if type(firstBreakdown[key]) == dict:
+                    continue
+                redField = BREAKDOWN_PREFIX + "red_" + key
+                blueField = BREAKDOWN_PREFIX + "blue_" + key
+                if redField not in matchTable.breakdownFields or blueField not in matchTable.breakdownFields:
+                    continue
+                if np.isfinite(table[redField][rows]).all() and np.isfinite(table[blueField][rows]).all():
+                    validKeys.append(key)
+        if len(validKeys) == 0:
+            return {}
+
+        #(matches , keys) arrays of breakdown values for each alliance
+        redValues = np.column_stack([table[BREAKDOWN_PREFIX + "red_" + key][rows] for key in validKeys])
+        blueValues = np.column_stack([table[BREAKDOWN_PREFIX + "blue_" + key][rows] for key in validKeys])
+
+        alliances = np.concatenate((red , blue))
+        A = self._getAllianceNormalMatrix(alliances , teamAmount)
+        B = np.zeros((teamAmount , len(validKeys)))
+        np.add.at(B , alliances.ravel() , np.repeat(np.concatenate((redValues , blueValues)) , 3 , axis = 0))
 
+        X = self._solveNormalEquations(A , B)
         out = {}
-        
-        #factoredA = lin.cho_factor(A , True , True , False)
-        for key in validKeys:
-            try:
-                out[key] = lin.solve(np.copy(A), BDict[key])
-            except:
-                #print("LEAST SQUARES SOLUTION USED.")
-                #print(A)
-                #print(B)
-                #print(lin.lstsq(A , B))
-                out[key] =  lin.lstsq(np.copy(A) , BDict[key])[0]
-            #out[key] = lin.cho_solve(np.copy(factoredA) , BDict[key] , False)
+        for i in range(len(validKeys)):
+            out[validKeys[i]] = X[: , i]
         return out
         
     def getTeamMatches(self , team):
         if type(team) == int:
             team = "frc" + str(team)
-        out = {}
         matchData = self.getMatchData()
-        for key in matchData.keys():
-            if team in matchData[key]["alliances"]["red"]["team_keys"]:
-                out[key] = matchData[key]
-            elif team in matchData[key]["alliances"]["blue"]["team_keys"]:
-                out[key] = matchData[key]
-        return out
+        keys = self._getMatchTable().keys
+        rows , colors , stations = self._getTeamRows(team)
+        return {keys[r] : matchData[keys[r]] for r in rows}
         
     def _allianceLookup(self, teams , lookup):
         for i in range(len(lookup)):
@@ -404,138 +557,196 @@ class Event:
         return alliances
 
     def getTeamDistrictPoints(self , teamNumber , rookieYear = None, includePlayoffs = True):
+        """
+            District points of one team, see getAllDistrictPoints
+            rookieYear is unused while rookie points aren't calculated
+        """
         code = teamNumber
         if type(teamNumber) == int:
             code = "frc"+str(teamNumber)
 
-        districtPoints = self.getDistrictPoints()
-        if (districtPoints is not None and code in districtPoints['points']) and self.getYear() >= 2015: #years from 2015 to now we can trust TBA data
-            return districtPoints["points"][code]
-        if self.getYear() == 2015:
-            print("WARNING: undefined behavior for 2015 elims points")
-            #raise Exception("Event getDistrictPoints calculator doesn't currently support 2015")
-        else:
-            #formula
-            rookiePoints = 0
-            awardsPoints = 0
-            playoffPoints = 0
-            alliancePoints = 0
-            rankingPoints = 0
-            
-            #rookie points
-            """
-            if rookieYear == None:
-                team = Team.Team(teamNumber)
-                rookieYear = team.teamData["rookie_year"]
-            yearDiff = self.eventData["year"] - rookieYear
-            if yearDiff < 2:
-                rookiePoints = 10 - (5 * yearDiff)
-            """
-
-            #awards points
-            awards = self.getAwardsObj()
-            for award in awards:
-                isRecipient = False
-                for recipient in award["recipient_list"]:
-                    if recipient["team_key"] == code:
-                        isRecipient = True
-                        break
-                if isRecipient:
-                    if award["award_type"] == 0: #chairmans
-                        awardsPoints += 10
-                    elif award["award_type"] == 9: #ei
-                        awardsPoints += 8
-                    elif award["award_type"] == 10: #rookie all star
-                        awardsPoints += 8
-                    elif award["award_type"] == 68:  #wildcard
-                        pass
-                    elif award["award_type"] == 14:  #highest rookie seed
-                        pass
-                    elif award["award_type"] > 10:
-                        awardsPoints += 5
-                        
-            #alliance selection results
-            allianceObj = self.getAlliances() #to facilitate the generation of them
-            if not allianceObj:
-                allianceObj = self._getAlliancesFromMatches()
-            for allianceNumber in range(len(allianceObj)):
-                alliance = allianceObj[allianceNumber]
-                if code in alliance["picks"]:
-                    if code == alliance["picks"][0]:
-                        alliancePoints = 16 - allianceNumber
-                    elif code == alliance["picks"][1]:
-                        alliancePoints = 16 - allianceNumber
-                    else:
-                        alliancePoints = 1 + allianceNumber
-                    break
-                    
-            #playoff performance
-            if includePlayoffs:
-                matchData = self.getMatchData()
-                for matchKeys in matchData:
-                    if "qm" not in matchKeys:
-                        winningAllianceKey = matchData[matchKeys]["winning_alliance"]
-                        if winningAllianceKey == "":
-                            winningAllianceKey = "red"
-                            if matchData[matchKeys]["alliances"]["red"]["score"] < matchData[matchKeys]["alliances"]["blue"]["score"]:
-                                winningAllianceKey = "blue"
-                        if code in matchData[matchKeys]["alliances"][winningAllianceKey]["team_keys"]:
-                            lastMatchInSeries = matchKeys[:-1]+"2" if matchKeys[:-1]+"3" not in matchData else matchKeys[:-1]+"3"
-                            if winningAllianceKey == matchData[lastMatchInSeries]["winning_alliance"]:
-                                playoffPoints += 5
-
-
-            #qualification round performance
-            rankings = self.getRankings()
-            r = -1
-            n = len(rankings['rankings'])
-            a = 1.07
-            for rankData in rankings["rankings"]:
-                if code == rankData["team_key"]:
-                    r = rankData["rank"]
-
-            rankingPoints = min(np.ceil((erfinv((n - (2 * r) + 2) / (a * n)) * (10 / (erfinv(1/a)))) + 12) , 22)
+        allPoints = self.getAllDistrictPoints(includePlayoffs)
+        if code not in allPoints:
+            raise(Exception("Event getTeamDistrictPoints: {} didn't play at {}".format(code , self.eventCode)))
+        if allPoints[code] is None or code in self._getTBADistrictPointTeams():
+            return allPoints[code]
+        return copy(allPoints[code])
 
-            out = {}
-            out["alliance_points"] = int(alliancePoints)
-            out["award_points"] = int(awardsPoints)
-            out["elim_points"] = int(playoffPoints)
-            out["qual_points"] = int(rankingPoints)
-            out["total"] = rookiePoints + alliancePoints + awardsPoints + playoffPoints + rankingPoints
+    def _getTBADistrictPointTeams(self):
+        """
+            Returns the set of team keys whose district points are taken from TBA instead of calculated
+        """
+        if "tbaDistrictPointTeams" not in self._derivedCache:
+            districtPoints = self.getDistrictPoints()
+            teams = set()
+            if districtPoints is not None and self.getYear() >= 2015: #years from 2015 to now we can trust TBA data
+                teams = set(districtPoints['points'])
+            self._derivedCache["tbaDistrictPointTeams"] = teams
+        return self._derivedCache["tbaDistrictPointTeams"]
+
+    def getAllDistrictPoints(self , includePlayoffs = True):
+        """
+            Returns dict of team key -> district points for every team in the team list and in TBA's district points
+            Years from 2015 on use TBA's numbers where TBA has them, the rest are calculated in one pass over
+            the awards, alliances, playoff series and rankings.
+            Teams 2015 points can't be calculated for (elims rules) hold None.
 
+            Calculated points are dicts of alliance_points , award_points , elim_points , qual_points and total
+            Rookie points aren't calculated
+        """
+        cacheKey = "allDistrictPoints" if includePlayoffs else "allDistrictPointsNoPlayoffs"
+        if cacheKey in self._derivedCache:
+            return self._derivedCache[cacheKey]
+
+        out = {}
+        year = self.getYear()
+        for code in self._getTBADistrictPointTeams():
+            out[code] = self.districtPoints['points'][code]
+        teams = [code for code in self.getTeamList() if code not in out]
+        if year == 2015:
+            if len(teams) > 0:
+                print("WARNING: undefined behavior for 2015 elims points")
+                #raise Exception("Event getDistrictPoints calculator doesn't currently support 2015")
+            for code in teams:
+                out[code] = None
+            self._derivedCache[cacheKey] = out
             return out
+        if len(teams) == 0:
+            self._derivedCache[cacheKey] = out
+            return out
+
+        #formula
+        rookiePoints = 0
+        awardsPoints = defaultdict(int)
+        playoffPoints = defaultdict(int)
+        alliancePoints = defaultdict(int)
+
+        #awards points
+        awards = self.getAwardsObj()
+        for award in awards:
+            points = 0
+            if award["award_type"] == 0: #chairmans
+                points = 10
+            elif award["award_type"] == 9: #ei
+                points = 8
+            elif award["award_type"] == 10: #rookie all star
+                points = 8
+            elif award["award_type"] == 68:  #wildcard
+                pass
+            elif award["award_type"] == 14:  #highest rookie seed
+                pass
+            elif award["award_type"] > 10:
+                points = 5
+            for code in set(recipient["team_key"] for recipient in award["recipient_list"]):
+                awardsPoints[code] += points
+
+        #alliance selection results, a team only gets points from the first alliance it's in
+        allianceObj = self.getAlliances() #to facilitate the generation of them
+        if not allianceObj:
+            allianceObj = self._getAlliancesFromMatches()
+        for allianceNumber in range(len(allianceObj)):
+            picks = allianceObj[allianceNumber]["picks"]
+            for pick in range(len(picks)):
+                if picks[pick] not in alliancePoints:
+                    alliancePoints[picks[pick]] = 16 - allianceNumber if pick < 2 else 1 + allianceNumber
+
+        #playoff performance, 5 points per match won by the alliance that went on to win the series
+        if includePlayoffs:
+            matchTable = self._getMatchTable()
+            table = matchTable.table
+            matchData = self.getMatchData()
+            for row in np.flatnonzero(table["comp_level"] != "qm"):
+                winner = table["winner"][row]
+                if winner == 0: #no winning_alliance counts as a red win unless blue outscored red
+                    winner = BLUE if table["RS"][row] < table["BS"][row] else RED
+                matchKey = matchTable.keys[row]
+                lastMatchInSeries = matchKey[:-1]+"2" if matchKey[:-1]+"3" not in matchTable.rowIndex else matchKey[:-1]+"3"
+                if winner == table["winner"][matchTable.rowIndex[lastMatchInSeries]]:
+                    for code in set(matchData[matchKey]["alliances"]["red" if winner == RED else "blue"]["team_keys"]):
+                        playoffPoints[code] += 5
+
+        #qualification round performance, every rank at once
+        rankings = self.getRankings()
+        ranks = {rankData["team_key"] : rankData["rank"] for rankData in rankings["rankings"]}
+        n = len(rankings['rankings'])
+        a = 1.07
+        r = np.array([ranks.get(code , -1) for code in teams])
+        rankingPoints = np.ceil((erfinv((n - (2 * r) + 2) / (a * n)) * (10 / (erfinv(1/a)))) + 12)
+
+        for i in range(len(teams)):
+            code = teams[i]
+            qualPoints = min(rankingPoints[i] , 22)
+            points = {}
+            points["alliance_points"] = int(alliancePoints[code])
+            points["award_points"] = int(awardsPoints[code])
+            points["elim_points"] = int(playoffPoints[code])
+            points["qual_points"] = int(qualPoints)
+            points["total"] = rookiePoints + alliancePoints[code] + awardsPoints[code] + playoffPoints[code] + qualPoints
+            out[code] = points
+        self._derivedCache[cacheKey] = out
+        return out
  
     def getTeamElimWins(self, teamNumber):
-        if not self.teamElimWins:
-            self.teamElimWins = {}
-        eventData = self.getEventData()
-        year = eventData["year"]
         argTeamCode = 'frc{}'.format(teamNumber)
-        if argTeamCode in self.teamElimWins:
-            return self.teamElimWins[argTeamCode]
-        for teamCode in self.teamList:
-            teamMatches = self.getTeamMatches(teamCode)
-            wins = 0
-            for matchKey in teamMatches.keys():
-                if teamMatches[matchKey]["comp_level"] != "qm":
-                    if year != 2015:
-                        color = "blue"
-                        if teamCode in teamMatches[matchKey]["alliances"]["red"]["team_keys"]:
-                            color = "red"
-                        if color == teamMatches[matchKey]["winning_alliance"]:
-                            wins += 1
-                    else:
-                        if (teamCode in teamMatches[matchKey]["alliances"]["red"]["team_keys"] \
-                            and teamMatches[matchKey]["alliances"]["red"]["score"] > teamMatches[matchKey]["alliances"]["blue"]["score"]) \
-                            or (teamCode in teamMatches[matchKey]["alliances"]["blue"]["team_keys"] \
-                            and teamMatches[matchKey]["alliances"]["blue"]["score"] > teamMatches[matchKey]["alliances"]["red"]["score"]):
-                            wins += 1
-                            
-            self.teamElimWins[teamCode] = wins if year != 2015 else min(wins, 6)
-        return self.teamElimWins[argTeamCode]
-
-        
-    def scoreMetricFromPattern(self , pattern = "B11 + B21 + B31 = BS;R11 + R21 + R31 = RS" , toMatch = 9999):
+        if "teamElimWins" not in self._derivedCache:
+            year = self.getYear()
+            table = self._getMatchTable().table
+            teamAmount = len(self.getTeamList())
+            elim = table["comp_level"] != "qm"
+            if year != 2015:
+                redWon = elim & (table["winner"] == RED)
+                blueWon = elim & (table["winner"] == BLUE)
+            else:
+                redWon = elim & (table["RS"] > table["BS"])
+                blueWon = elim & (table["BS"] > table["RS"])
+            #Stations of teams outside the team list hold -1, shifted onto a slot that's dropped
+            winners = np.concatenate([table[station][redWon] for station in ("R1" , "R2" , "R3")] +
+                                     [table[station][blueWon] for station in ("B1" , "B2" , "B3")])
+            wins = np.bincount(winners + 1 , minlength = teamAmount + 1)[1:]
+            if year == 2015:
+                wins = np.minimum(wins , 6)
+            self._derivedCache["teamElimWins"] = {self.teamList[i] : int(wins[i]) for i in range(teamAmount)}
+        return self._derivedCache["teamElimWins"][argTeamCode]
+
+    def getElimStats(self):
+        """
+            Returns dict of team key -> playoff stats for every team that played a playoff match, in one pass over the playoff matches
+                playoff_wins - playoff matches won (by winning_alliance)
+                series_wins - playoff series (comp level and set number) won, the winner being the alliance that won the most of its matches
+                furthest_round - index in ELIM_ROUNDS of the furthest round played, len(ELIM_ROUNDS) for the winners of the finals
+        """
+        if "elimStats" not in self._derivedCache:
+            matchTable = self._getMatchTable()
+            table = matchTable.table
+            matchData = self.getMatchData()
+            stats = {}
+            series = {} #(comp level , set number) -> {RED : [wins , teams] , BLUE : [wins , teams]}
+            for row in np.flatnonzero(np.isin(table["comp_level"] , ELIM_ROUNDS)):
+                level = str(table["comp_level"][row])
+                winner = table["winner"][row]
+                alliances = matchData[matchTable.keys[row]]["alliances"]
+                matchSeries = series.setdefault((level , table["set_number"][row]) , {RED : [0 , set()] , BLUE : [0 , set()]})
+                for color , colorName in ((RED , "red") , (BLUE , "blue")):
+                    if winner == color:
+                        matchSeries[color][0] += 1
+                    for team in alliances[colorName]["team_keys"]:
+                        matchSeries[color][1].add(team)
+                        teamStats = stats.setdefault(team , {"playoff_wins" : 0 , "series_wins" : 0 , "furthest_round" : 0})
+                        teamStats["furthest_round"] = max(teamStats["furthest_round"] , ELIM_ROUNDS.index(level))
+                        if winner == color:
+                            teamStats["playoff_wins"] += 1
+            for (level , setNumber) , matchSeries in series.items():
+                if matchSeries[RED][0] == matchSeries[BLUE][0]:
+                    continue
+                winners = matchSeries[RED][1] if matchSeries[RED][0] > matchSeries[BLUE][0] else matchSeries[BLUE][1]
+                for team in winners:
+                    stats[team]["series_wins"] += 1
+                    if level == "f":
+                        stats[team]["furthest_round"] = len(ELIM_ROUNDS)
+            self._derivedCache["elimStats"] = stats
+        return self._derivedCache["elimStats"]
+
+    def scoreMetricFromPattern(self , pattern = "B11 + B21 + B31 = BS;R11 + R21 + R31 = RS" , toMatch = 9999 , solver = "auto"):
         """
             This allows us to plug in linear equations we might find interesting to play with. 
             These equations are made up of variables we can solve for and constants from each match's data
@@ -559,84 +770,131 @@ class Event:
                 
             The way to see what variables are available to use for a certain event, run the function getValidPatternData().
                 A list of valid constant variables are returned that can be used in calculations
+
+            solver picks how the least squares system is solved
+                "dense"  - pseudo inverse of the dense system
+                "sparse" - sparse system, solved through its normal equations (cholesky) or LSMR when those are singular
+                "auto"   - dense for tiny systems, sparse otherwise
+
+            Results are kept in the derived metric cache (see _getDerivedMetric), keyed by pattern , toMatch and solver
         """
-        varsPerTeam = 0
-        splitPattern = pattern.split(";")
-        suffixList = self._getPatternSuffixList(pattern)
+        suffixList = _getCompiledPattern(pattern).suffixList
         lookupDict = self._getLookupDict() #associates a team to an index for fast lookup
+        definition = "pattern {} toMatch {} solver {}".format(pattern , toMatch , solver)
+        columns = self._getDerivedMetric(definition , lambda : self._solvePattern(pattern , toMatch , solver))
+        out = {}
+        for suffix in suffixList:
+            column = columns["suffix" + suffix].tolist()
+            for t in lookupDict:
+                out[str(t)+suffix] = column[lookupDict[t]]
+        return out
+
+    def _solvePattern(self , pattern , toMatch , solver):
+        """
+            Solves scoreMetricFromPattern's system, returns dict of "suffix" + suffix -> array where teams are looked up by index
+        """
+        compiledPattern = _getCompiledPattern(pattern)
+        suffixList = compiledPattern.suffixList
         suffixAmount = len(suffixList)
-        splitPatternAmount = len(splitPattern)
+        lookupDict = self._getLookupDict()
         
         #Construct Numpy Arrays Ax = B
-        #A is a len(suffixList) * len(teamList) by len(splitPattern) * len(matches) array - What we populate with _Pattern_Variable information
+        #A is a len(suffixList) * len(teamList) by len(splitPattern) * len(matches) array - What we populate with pattern coefficients
         #x is a vector of len(suffixList) * len(teamList) - What we are solving for 
         #B is a vector of len(splitPattern) * len(matches) - What we populate with score information and the whatnot 
-        totalMatches = self.getQualMatchAmount()
-        if totalMatches > toMatch:
-            totalMatches = toMatch
-        A = np.zeros((len(splitPattern) * totalMatches , suffixAmount * len(self.getTeamList())))
-        B = np.zeros((len(splitPattern) * totalMatches))
-        
-        matchNum = 0
-        sortedMatches = [self.matchData[m] for m in self.getMatchData()]
-        sortedMatches.sort(key = lambda x: float(x["match_number"]))
-        
-        for match in sortedMatches:
-            if match["comp_level"] == "qm" and match["match_number"] < toMatch: #Only run on qm matches and matches under toMatch
-                RS = match["alliances"]["red"]["score"]
-                BS = match["alliances"]["blue"]["score"]
-                if RS != -1 and BS != -1: #Is a valid match
-                    matchTeams = {"B1" : match["alliances"]["blue"]["team_keys"][0] , "B2" : match["alliances"]["blue"]["team_keys"][1] , "B3" : match["alliances"]["blue"]["team_keys"][2], \
-                    "R1" : match["alliances"]["red"]["team_keys"][0] , "R2" : match["alliances"]["red"]["team_keys"][1] , "R3" : match["alliances"]["red"]["team_keys"][2]}
-                    #Create flattened dictionary to use for computations
-                    matchFlat = self.flattenDictionary(match)
-                    matchFlat["RS"] = RS
-                    matchFlat["BS"] = BS
-                    for col in ["B1" , "B2" , "B3" , "R1" , "R2" , "R3"]:
-                        i = 0
-                        for suff in suffixList:
-                            matchFlat[col + suff] = _Pattern_Variable(col + suff , (lookupDict[matchTeams[col]] * suffixAmount) + i)
-                            i += 1
-                    #Run Patterns
-                    i = 0
-                    for indPat in splitPattern:
-                        B[(matchNum * splitPatternAmount) + i] = self._decomposePattern(indPat , matchFlat)
-                        for col in ["B1" , "B2" , "B3" , "R1" , "R2" , "R3"]:
-                            for suff in suffixList:
-                                A[(matchNum * splitPatternAmount) + i][matchFlat[col + suff].getIndex()] = matchFlat[col + suff].getFactor()
-                                matchFlat[col + suff].resetFactor()
-                        i += 1
-                    #Modify Matricies    
-                matchNum += 1
-        AMP = np.linalg.pinv(A)
-        X = (AMP.dot(B)).tolist()
-        out = {}
-        for t in lookupDict:
-            for i in range(suffixAmount):
-                out[str(t)+suffixList[i]] = X[(lookupDict[t] * suffixAmount) + i]
+        matchRows , stations = self._getPatternMatches(toMatch)
+        rows , cols , values , B = compiledPattern.evaluate(self , matchRows , stations , len(lookupDict))
+        shape = (len(B) , suffixAmount * len(lookupDict))
+        if solver == "auto":
+            solver = "dense" if shape[0] * shape[1] <= DENSE_PATTERN_SIZE else "sparse"
+        if solver == "dense":
+            A = np.zeros(shape)
+            np.add.at(A , (rows , cols) , values)
+            AMP = np.linalg.pinv(A)
+            X = AMP.dot(B)
+        elif solver == "sparse":
+            A = sparse.csr_matrix((values , (rows , cols)) , shape = shape) #duplicate entries are summed
+            X = _solveSparseLeastSquares(A , B)
+        else:
+            raise(Exception("Unknown solver {}".format(solver)))
+        #Variable (team index * suffixAmount) + suffix index
+        return {"suffix" + suffixList[i] : X[i::suffixAmount] for i in range(suffixAmount)}
+
+    def _getDerivedMetric(self , definition , compute):
+        """
+            Persistent cache of metrics derived from the match data, stored as npz through the client (one entry per definition)
+
+            definition - string describing the metric and every parameter it depends on
+            compute - function returning a dict of name -> array, called when the entry is missing or stale
+
+            Entries hold a fingerprint of their inputs: the matches' Last-Modified, the team list, the qual match amount
+            and a hash of the played qual rows of the match table (keys , stations , scores and score breakdown columns).
+            An entry whose fingerprint doesn't match is recomputed and overwritten, so refreshed or locally updated
+            match data invalidates it.
+        """
+        fileName = "{}-metric-{}".format(self.eventCode , hashlib.sha1(definition.encode("utf-8")).hexdigest()[:16])
+        matchTable = self._getMatchTable()
+        rows = self._getQualRows()
+        rowHash = hashlib.sha1(json.dumps([[matchTable.keys[row] for row in rows] , matchTable.table.dtype.names]).encode("utf-8"))
+        rowHash.update(np.ascontiguousarray(matchTable.table[rows]).tobytes())
+        fingerprint = json.dumps([self.readValidityData()["{}-matches".format(self.eventCode)] , self.getTeamList() ,
+                                  self.getQualMatchAmount() , rowHash.hexdigest()])
+        stored = _Singleton_TBA_Client.readEventArrays(fileName)
+        if stored is not None and str(stored.get("__definition__")) == definition and str(stored.get("__fingerprint__")) == fingerprint:
+            return {name : stored[name] for name in stored if not name.startswith("__")}
+        out = compute()
+        arrays = dict(out)
+        arrays["__definition__"] = np.array(definition)
+        arrays["__fingerprint__"] = np.array(fingerprint)
+        _Singleton_TBA_Client.writeEventArrays(fileName , arrays)
         return out
+
+    def _getPatternMatches(self , toMatch = 9999):
+        """
+            Returns (matchRows , stations) of the played qual matches with a match number under toMatch, in match number order
+                matchRows - match table rows of the matches
+                stations - dict of "B1" ... "R3" -> array of team indices, one per match
+        """
+        matchKeys , red , blue , redScore , blueScore = self._getQualAllianceArrays()
+        rows = self._getQualRows()
+        matchNumbers = self._getMatchTable().table["match_number"][rows]
+        order = np.argsort(matchNumbers , kind = "stable")
+        order = order[matchNumbers[order] < toMatch]
+        stations = {}
+        for i in range(3):
+            stations["B{}".format(i + 1)] = blue[order , i]
+            stations["R{}".format(i + 1)] = red[order , i]
+        return rows[order] , stations
+
+    def _getPatternColumn(self , name , matchRows):
+        """
+            Returns an array with the value of the flattened match field name (see flattenDictionary) for every match table row in matchRows
+            Scores and numeric score_breakdown fields come straight from the match table,
+            other fields are looked up in the match dicts, the path to the field is resolved once, on the first match
+        """
+        matchTable = self._getMatchTable()
+        if name == "RS" or name == "BS" or name in matchTable.breakdownFields:
+            return matchTable.table[name][matchRows]
+        if len(matchRows) == 0:
+            return np.zeros(0)
+        matchData = self.getMatchData()
+        matchKeys = [matchTable.keys[r] for r in matchRows]
+        path = _getFlattenedPath(matchData[matchKeys[0]] , name)
+        if path is None:
+            raise(Exception("Unknown pattern variable {}, see getValidPatternData()".format(name)))
+        column = []
+        for m in matchKeys:
+            value = matchData[m]
+            for key in path:
+                value = value[key]
+            column.append(value)
+        return np.array(column , dtype = float)
         
-    def _decomposePattern(self , pattern , flattenedMatch):
-        #print(pattern)
-        splitPattern = pattern.split("=")
-        eval(splitPattern[0] , flattenedMatch)
-        #self.ld = (flattenedMatch["B11"].getFactor() , flattenedMatch["B21"].getFactor() ,  flattenedMatch["R11"].getFactor() ,  flattenedMatch["R21"].getFactor())
-        return eval(splitPattern[1] , flattenedMatch)
-        
-    
     def _getPatternSuffixList(self , pattern):
         """
             Returns how many variables are needed to be stored per team.
         """
-        colorKeys = "B1", "B2" , "B3" , "R1" , "R2" , "R3"
-        suffixSet = set()
-        for colorKey in colorKeys:
-            expr = "{}(\w*)".format(colorKey)
-            allSuff = re.findall(expr , pattern)
-            for suff in allSuff:
-                suffixSet.add(suff)
-                
-        return list(suffixSet)
+        return _getCompiledPattern(pattern).suffixList
                 
         
     def _metricArrayToDict(self , metricArray):
@@ -664,13 +922,10 @@ class Event:
         return out
 
     def readValidityData(self):
-        self._old_validity_data =  _Singleton_TBA_Client.dictToDefaultDict(_Singleton_TBA_Client.readEventData(self.validityFile) , lambda:None)
-        return copy(self._old_validity_data)
+        return self.validity.read()
 
     def writeValidityData(self, validityData):
-        if self._old_validity_data == validityData:
-            return True
-        return _Singleton_TBA_Client.writeEventData(self.validityFile , validityData)
+        return self.validity.write(validityData)
 
     def loadData(self):
         '''
@@ -682,100 +937,98 @@ class Event:
             
         '''
 
-        self.loadEventData()
-        self.loadMatchData()
-        self.loadRankingsData()
-        self.loadTeamList()
-        self.loadDistrictPoints()
-        self.loadAwards()
-        self.loadAlliances()
+        with self.validity: #validity file is written once, after every request
+            jobs = self._endpointJobs()
+            results = _Singleton_TBA_Client.fetchMany(list(jobs.values())) #every endpoint is requested concurrently
+            for attribute , result in zip(jobs , results):
+                setattr(self , attribute , result)
+            self.fetchedMatches = True
+            self.fetchedRankings = True
+            self.fetchedAlliances = True
+            self.fetchedDistrictPoints = True
+            self.fetchedAwards = True
+            self.qualMatchAmount = None
+            self._setTeamList()
 
         ###Derived Calculations###
 
         self.loadOprs()
         self.loadCoprs()
 
-
-    def loadEventData(self):
-        validityData = self.readValidityData()
-        dataObjName = "{}-data".format(self.eventCode)
-        dataRequest = "event/{}".format(self.eventCode)
-        self.eventData = _Singleton_TBA_Client.makeSmartRequest(dataObjName, dataRequest, validityData, self,
-                                                                self.cacheRefreshAggression)
-        self.writeValidityData(validityData)
-
-    def loadMatchData(self):
-        validityData = self.readValidityData()
+    def _endpointJobs(self):
+        """
+            fetchMany jobs for every TBA endpoint of this event, keyed by the attribute the result is stored in
+        """
         def matchDataMutator(md):
             out = {}
             for m in md:
                 out[m["key"].replace(self.eventCode + "_", "")] = m
             return out
 
-        matchObjName = "{}-matches".format(self.eventCode)
-        matchRequest = "event/{}/matches".format(self.eventCode)
-        self.matchData = _Singleton_TBA_Client.makeSmartRequest(matchObjName, matchRequest, validityData, self,
-                                                                self.cacheRefreshAggression, matchDataMutator)
-        self.writeValidityData(validityData)
+        code = self.eventCode
+        jobs = {}
+        jobs["eventData"]      = ("{}-data".format(code)           , "event/{}".format(code)                 , self)
+        jobs["matchData"]      = ("{}-matches".format(code)        , "event/{}/matches".format(code)         , self , matchDataMutator)
+        jobs["rankings"]       = ("{}-rankings".format(code)       , "event/{}/rankings".format(code)        , self)
+        jobs["rawTeamList"]    = ("{}-teamlist".format(code)       , "event/{}/teams/keys".format(code)      , self)
+        # Containts both tie breaker and point data
+        jobs["districtPoints"] = ("{}-districtpoints".format(code) , "event/{}/district_points".format(code) , self)
+        jobs["awards"]         = ("{}-awards".format(code)         , "event/{}/awards".format(code)          , self)
+        jobs["alliances"]      = ("{}-alliances".format(code)      , "event/{}/alliances".format(code)       , self)
+        return jobs
 
-    def loadRankingsData(self):
+    def _loadEndpoint(self , attribute):
+        job = self._endpointJobs()[attribute]
         validityData = self.readValidityData()
-        rankingsObjName = "{}-rankings".format(self.eventCode)
-        rankingsRequest = "event/{}/rankings".format(self.eventCode)
-        self.rankings = _Singleton_TBA_Client.makeSmartRequest(rankingsObjName, rankingsRequest, validityData, self,
-                                                               self.cacheRefreshAggression)
+        dataMutator = job[3] if len(job) > 3 else None
+        setattr(self , attribute , _Singleton_TBA_Client.makeSmartRequest(job[0], job[1], validityData, self,
+                                                                          self.cacheRefreshAggression, dataMutator))
         self.writeValidityData(validityData)
+        if attribute in ("awards" , "alliances" , "rankings" , "districtPoints"):
+            #getAllDistrictPoints is built from these
+            self._derivedCache.pop("allDistrictPoints" , None)
+            self._derivedCache.pop("allDistrictPointsNoPlayoffs" , None)
+            self._derivedCache.pop("tbaDistrictPointTeams" , None)
+
+    def loadEventData(self):
+        self._loadEndpoint("eventData")
+
+    def loadMatchData(self):
+        self._loadEndpoint("matchData")
+        self.qualMatchAmount = None
+        self._derivedCache = {}
+
+    def loadRankingsData(self):
+        self._loadEndpoint("rankings")
 
     def loadTeamList(self):
-        validityData = self.readValidityData()
-        teamListObjName = "{}-teamlist".format(self.eventCode)
-        teamListRequest = "event/{}/teams/keys".format(self.eventCode)
-        self.rawTeamList = _Singleton_TBA_Client.makeSmartRequest(teamListObjName, teamListRequest, validityData, self,
-                                                                  self.cacheRefreshAggression)
+        self._loadEndpoint("rawTeamList")
+        self._setTeamList()
+
+    def _setTeamList(self):
         try:
             self.teamList = self.getPlayingTeamList(True)
         except:
             self.teamList = None
-        self.writeValidityData(validityData)
+        self.lookup = None
+        self._derivedCache = {}
 
     def loadDistrictPoints(self):
-        validityData = self.readValidityData()
-        # Containts both tie breaker and point data
-        districtPointsObjName = "{}-districtpoints".format(self.eventCode)
-        districtPointsRequest = "event/{}/district_points".format(self.eventCode)
-        self.districtPoints = _Singleton_TBA_Client.makeSmartRequest(districtPointsObjName, districtPointsRequest,
-                                                                     validityData, self, self.cacheRefreshAggression)
-        self.writeValidityData(validityData)
+        self._loadEndpoint("districtPoints")
 
     def loadAwards(self):
-        validityData = self.readValidityData()
-        awardsObjName = "{}-awards".format(self.eventCode)
-        awardsRequest = "event/{}/awards".format(self.eventCode)
-        self.awards = _Singleton_TBA_Client.makeSmartRequest(awardsObjName, awardsRequest, validityData, self,
-                                                             self.cacheRefreshAggression)
-        self.writeValidityData(validityData)
+        self._loadEndpoint("awards")
 
     def loadAlliances(self):
-        validityData = self.readValidityData()
-        allianceObjName = "{}-alliances".format(self.eventCode)
-        allianceRequest = "event/{}/alliances".format(self.eventCode)
-        self.alliances = _Singleton_TBA_Client.makeSmartRequest(allianceObjName, allianceRequest, validityData, self,
-                                                                self.cacheRefreshAggression)
-        self.writeValidityData(validityData)
+        self._loadEndpoint("alliances")
 
     def loadOprs(self):
-        self.oprs = np.array(_Singleton_TBA_Client.readEventData("{}-oprs".format(self.eventCode)))
-        if self.oprs.size <= 1:
-            self.oprs = self.getArrayOPRS()
-            _Singleton_TBA_Client.writeEventData("{}-oprs".format(self.eventCode), self.oprs.tolist())
+        self.oprs = self._getDerivedMetric("oprs" , lambda : {"oprs" : self.getArrayOPRS()})["oprs"]
 
     def loadCoprs(self):
         # We can't get COPRS for old games
         try:
-            self.coprs = np.array(_Singleton_TBA_Client.readEventData("{}-coprs".format(self.eventCode)))
-            if self.coprs.size <= 1:
-                self.coprs = self.getComponentOPRS()
-                _Singleton_TBA_Client.writeEventData("{}-coprs".format(self.eventCode), self.coprs.tolist())
+            self.coprs = self._getDerivedMetric("coprs" , self.getComponentOPRS)
         except:
             pass
 
@@ -835,84 +1088,181 @@ class Event:
         return awardsDict
 
         
-class _Pattern_Variable:
-    def __init__(self , name , arrayIndex):
-        self.name  = name
-        self.factor = 0
-        self.index = arrayIndex
-        
-    def _initFactor(self):
-        if self.factor == 0:
-            self.factor = 1
-        
-    def __rmul__(self , other):
-        self._initFactor()
-        if type(other) == _Pattern_Variable:
-            raise Exception("Pattern Variable not allowed to be multiplied with another Pattern Variable!")
-        self.factor *= other
-        return self
-        
-    def __mul__(self , other):
-        self._initFactor()
-        if type(other) == _Pattern_Variable:
-            raise Exception("Pattern Variable not allowed to be multiplied with another Pattern Variable!")
-        self.factor *= other
-        return self
-
-    def __div__(self , other):
-        self._initFactor()
-        if type(other) == _Pattern_Variable:
-            raise Exception("Pattern Variable not allowed to be divided with another Pattern Variable!")
-        self.factor /= other
-        return self
-
-    def __rdiv__(self , other):
-        self._initFactor()
-        if type(other) == _Pattern_Variable:
-            raise Exception("Pattern Variable not allowed to be divided with another Pattern Variable!")
-        #self.factor /= other
-        return self
-
-    def __add__(self , other):
-        self._initFactor()
-        if type(other) == _Pattern_Variable:
-            other._initFactor()
-        return self
-
-    def __radd__(self , other):
-        self._initFactor()
-        if type(other) == _Pattern_Variable:
-            other._initFactor()
-        return self
-
-    def __sub__(self , other):
-        self._initFactor()
-        if type(other) == _Pattern_Variable:
-            other._initFactor()
-        if type(other) == _Pattern_Variable:
-            other *= -1
-        return self
-
-    def __rsub__(self , other):
-        self._initFactor()
-        if type(other) == _Pattern_Variable:
-            other._initFactor()
-        if type(other) == _Pattern_Variable:
-            self.factor *= -1
-        return self
-
-    #def __int__(self):
-    #    self._initFactor()
-    #    return self.factor
-    
-    def getFactor(self):
-        return self.factor
-        
-    def getIndex(self):
-        return self.index
-    
-    def resetFactor(self):
-        self.factor = 0
+def _solveSparseLeastSquares(A , B):
+    """
+        Minimum norm least squares solution of the sparse system A x = B, the same solution the pseudo inverse gives
+        With few enough variables the (small , dense) normal equations are solved instead,
+        by cholesky when they are full rank and by least squares when they are not.
+        Larger systems go through LSMR, which converges to the minimum norm solution from a zero start.
+    """
+    if A.shape[1] <= DENSE_NORMAL_VARIABLES:
+        N = (A.T @ A).toarray()
+        rhs = A.T @ B
+        try:
+            factor = lin.cho_factor(N)
+            pivots = np.abs(np.diag(factor[0])) ** 2
+            if pivots.min() > 1e-10 * pivots.max(): #Round off can let a singular matrix through the factorization
+                return lin.cho_solve(factor , rhs)
+        except lin.LinAlgError:
+            pass
+        #Null spaces of A and A.T @ A are the same, so the minimum norm solutions are too
+        return lin.lstsq(N , rhs , cond = 1e-10)[0]
+    return sparse_linalg.lsmr(A , B , atol = 1e-12 , btol = 1e-12 , maxiter = 10 * A.shape[1])[0]
+
+
+def _getFlattenedPath(inDict , name):
+    """
+        Returns the tuple of keys leading to the value flattenDictionary would store under name, None if there is none
+    """
+    for k in inDict:
+        if type(inDict[k]) == dict:
+            if name.startswith(k + "_"):
+                inner = _getFlattenedPath(inDict[k] , name[len(k) + 1:])
+                if inner is not None:
+                    return (k ,) + inner
+        elif k == name:
+            return (k ,)
+    return None
+
+
+def _oprEntry(match):
+    """
+        Returns what a match contributes to the OPRs, (red team keys , blue team keys , red score , blue score),
+        None if match isn't a played qual match
+    """
+    if match is None or match["comp_level"] != "qm":
+        return None
+    RS = match["alliances"]["red"]["score"]
+    BS = match["alliances"]["blue"]["score"]
+    if RS == -1 or BS == -1:
+        return None
+    return (list(match["alliances"]["red"]["team_keys"][:3]) , list(match["alliances"]["blue"]["team_keys"][:3]) , RS , BS)
+
+
+class _Compiled_Pattern:
+    """
+        A scoreMetricFromPattern pattern parsed once into equation syntax trees.
+
+        Only numbers , names , + , - , * , / and parentheses are accepted, nothing is passed to eval.
+        Names made of a station (B1 , B2 , B3 , R1 , R2 , R3) and a suffix are the team variables we solve for,
+        any other name is a flattened match field (or RS / BS).
+        Every equation is evaluated over all matches at once as a linear form,
+        a dict of variable -> coefficient array plus a constant array.
+    """
+    STATIONS = ("B1" , "B2" , "B3" , "R1" , "R2" , "R3")
+
+    def __init__(self , pattern , suffixList):
+        self.pattern = pattern
+        self.suffixList = suffixList
+        self.suffixIndex = {suffixList[i] : i for i in range(len(suffixList))}
+        self.equations = []
+        for indPat in pattern.split(";"):
+            splitPattern = indPat.split("=")
+            if len(splitPattern) < 2:
+                raise(Exception("Pattern equation {} has no =".format(indPat)))
+            lhs = ast.parse(splitPattern[0].strip() , mode = "eval").body
+            rhs = ast.parse(splitPattern[1].strip() , mode = "eval").body
+            self._validate(lhs)
+            self._validate(rhs)
+            self.equations.append((lhs , rhs))
+
+    def _validate(self , node):
+        if isinstance(node , ast.BinOp) and type(node.op) in (ast.Add , ast.Sub , ast.Mult , ast.Div):
+            self._validate(node.left)
+            self._validate(node.right)
+        elif isinstance(node , ast.UnaryOp) and type(node.op) in (ast.USub , ast.UAdd):
+            self._validate(node.operand)
+        elif isinstance(node , ast.Constant) and type(node.value) in (int , float):
+            pass
+        elif isinstance(node , ast.Name):
+            pass
+        else:
+            raise(Exception("Unsupported expression in pattern: {}".format(ast.dump(node))))
+
+    def _isVariable(self , name):
+        return name[:2] in self.STATIONS and name[2:] in self.suffixIndex
+
+    def evaluate(self , event , matchRows , stations , teamAmount):
+        """
+            Returns (rows , cols , values , B) , the entries of A and the vector B of Ax = B
+            Row (match * len(equations)) + equation holds an equation for a match
+        """
+        matchAmount = len(matchRows)
+        equationAmount = len(self.equations)
+        columns = {}
+        rows = []
+        cols = []
+        values = []
+        B = np.zeros(matchAmount * equationAmount)
+        for e in range(equationAmount):
+            lhs , rhs = self.equations[e]
+            lhsForm = self._evaluateNode(lhs , event , matchRows , columns)
+            rhsForm = self._evaluateNode(rhs , event , matchRows , columns)
+            equationRows = np.arange(matchAmount) * equationAmount + e
+            #Everything with a variable goes to A, everything else to B
+            B[equationRows] = rhsForm[1] - lhsForm[1]
+            for sign , form in ((1 , lhsForm) , (-1 , rhsForm)):
+                for name , coefficient in form[0].items():
+                    rows.append(equationRows)
+                    cols.append(stations[name[:2]] * len(self.suffixList) + self.suffixIndex[name[2:]])
+                    values.append(sign * np.broadcast_to(coefficient , (matchAmount ,)))
+        if len(rows) == 0:
+            return np.zeros(0 , dtype = np.intp) , np.zeros(0 , dtype = np.intp) , np.zeros(0) , B
+        return np.concatenate(rows) , np.concatenate(cols) , np.concatenate(values) , B
+
+    def _evaluateNode(self , node , event , matchRows , columns):
+        """
+            Returns the linear form (dict of variable name -> coefficient , constant) of node over every match
+        """
+        if isinstance(node , ast.Constant):
+            return {} , float(node.value)
+        if isinstance(node , ast.Name):
+            if self._isVariable(node.id):
+                return {node.id : 1.0} , 0.0
+            if node.id not in columns:
+                columns[node.id] = event._getPatternColumn(node.id , matchRows)
+            return {} , columns[node.id]
+        if isinstance(node , ast.UnaryOp):
+            variables , constant = self._evaluateNode(node.operand , event , matchRows , columns)
+            if isinstance(node.op , ast.USub):
+                return {k : -v for k , v in variables.items()} , -constant
+            return variables , constant
+        left = self._evaluateNode(node.left , event , matchRows , columns)
+        right = self._evaluateNode(node.right , event , matchRows , columns)
+        if isinstance(node.op , (ast.Add , ast.Sub)):
+            sign = 1 if isinstance(node.op , ast.Add) else -1
+            variables = dict(left[0])
+            for k , v in right[0].items():
+                variables[k] = variables.get(k , 0.0) + sign * v
+            return variables , left[1] + sign * right[1]
+        if isinstance(node.op , ast.Mult):
+            if len(left[0]) > 0 and len(right[0]) > 0:
+                raise(Exception("Pattern Variable not allowed to be multiplied with another Pattern Variable!"))
+            if len(left[0]) > 0:
+                left , right = right , left
+            return {k : v * left[1] for k , v in right[0].items()} , left[1] * right[1]
+        #Division
+        if len(right[0]) > 0:
+            raise(Exception("Pattern Variable not allowed to be divided by a Pattern Variable!"))
+        return {k : v / right[1] for k , v in left[0].items()} , left[1] / right[1]
+
+
+_compiledPatterns = {}
+
+def _getCompiledPattern(pattern):
+    """
+        Patterns are only parsed the first time they are used
+    """
+    if pattern not in _compiledPatterns:
+        colorKeys = "B1", "B2" , "B3" , "R1" , "R2" , "R3"
+        suffixSet = set()
+        for colorKey in colorKeys:
+            expr = r"{}(\w*)".format(colorKey)
+            allSuff = re.findall(expr , pattern)
+            for suff in allSuff:
+                suffixSet.add(suff)
+        _compiledPatterns[pattern] = _Compiled_Pattern(pattern , list(suffixSet))
+    return _compiledPatterns[pattern]
 
 
 _eventShare = ObjectShare(Event)
@@ -0,0 +1,130 @@
+import numpy as np
+import scipy.linalg as lin
+
+class IncrementalOPR:
+    """
+        OPR kept up to date one match at a time.
+
+        Holds the normal equations (A , B) of every alliance added so far.
+        Once A is invertible its inverse is kept as well and every alliance is folded in with a Sherman-Morrison update,
+        a rank 1 update costing O(teams^2) instead of a new O(teams^3) solve.
+        Until then (not every team has played yet, or the schedule doesn't tie the teams together) alliances are only
+        accumulated, and the OPRs, the minimum norm least squares solution over the teams that have played (NaN for the others),
+        are solved when getOprs asks for them.
+        A factorization is only attempted once every team has played, the first point A can be invertible.
+
+        Used by Event.updateOprs and Event.getOPRProgression
+    """
+    def __init__(self , teamKeys):
+        self.teamKeys = list(teamKeys)
+        self.lookup = {self.teamKeys[i] : i for i in range(len(self.teamKeys))}
+        teamAmount = len(self.teamKeys)
+        self.A = np.zeros((teamAmount , teamAmount))
+        self.B = np.zeros(teamAmount)
+        self.Ainv = None
+        self.oprs = np.full(teamAmount , np.nan)
+        self.solved = True #self.oprs holds the solution of the current A and B
+        self.playedAmount = 0 #teams with a nonzero diagonal in A
+        self.matchKeys = set()
+
+    def getTeamIndex(self , teamKey):
+        """
+            Returns the index of teamKey, adding it if it isn't known yet
+        """
+        if teamKey not in self.lookup:
+            self.lookup[teamKey] = len(self.teamKeys)
+            self.teamKeys.append(teamKey)
+            self.A = np.pad(self.A , ((0 , 1) , (0 , 1)))
+            self.B = np.append(self.B , 0)
+            self.oprs = np.append(self.oprs , np.nan)
+            self.Ainv = None
+        return self.lookup[teamKey]
+
+    def addMatch(self , matchKey , red , blue , redScore , blueScore):
+        """
+            red , blue - team keys of each alliance
+            Returns False if matchKey was already added
+        """
+        if matchKey in self.matchKeys:
+            return False
+        redIndices = np.array([self.getTeamIndex(t) for t in red])
+        blueIndices = np.array([self.getTeamIndex(t) for t in blue])
+        return self.addMatchIndices(matchKey , redIndices , blueIndices , redScore , blueScore)
+
+    def addMatchIndices(self , matchKey , redIndices , blueIndices , redScore , blueScore):
+        """
+            addMatch with alliances given as arrays of team indices
+        """
+        if matchKey in self.matchKeys:
+            return False
+        self.matchKeys.add(matchKey)
+        self._addAlliance(redIndices , redScore)
+        self._addAlliance(blueIndices , blueScore)
+        if self.Ainv is None:
+            self.solved = False
+            if self.playedAmount == len(self.teamKeys):
+                self._factor()
+        return True
+
+    def addMatches(self , matchKeys , red , blue , redScore , blueScore):
+        """
+            Bulk version of addMatch, red and blue are (matches , 3) arrays of team indices
+            The normal equations are accumulated in one pass and solved once
+        """
+        teamAmount = len(self.teamKeys)
+        alliances = np.concatenate((red , blue))
+        rows = np.repeat(alliances , 3 , axis = 1).ravel()
+        cols = np.tile(alliances , (1 , 3)).ravel()
+        self.A += np.bincount(rows * teamAmount + cols , minlength = teamAmount * teamAmount).reshape(teamAmount , teamAmount)
+        self.B += np.bincount(alliances.ravel() , weights = np.repeat(np.concatenate((redScore , blueScore)) , 3) , minlength = teamAmount)
+        self.playedAmount = int(np.count_nonzero(np.diag(self.A)))
+        self.matchKeys.update(matchKeys)
+        self.refactor()
+
+    def _addAlliance(self , indices , score):
+        for i in indices:
+            if self.A[i , i] == 0:
+                self.playedAmount += 1
+        self.A[np.ix_(indices , indices)] += 1
+        self.B[indices] += score
+        if self.Ainv is not None:
+            u = self.Ainv[: , indices].sum(axis = 1) #Ainv @ r , r being the alliance's indicator vector
+            denominator = 1 + u[indices].sum()
+            self.oprs += u * ((score - self.oprs[indices].sum()) / denominator)
+            self.Ainv -= np.outer(u , u / denominator)
+
+    def _factor(self):
+        """
+            Inverts A through its cholesky factorization when A is well conditioned, True if it was
+        """
+        self.Ainv = None
+        if len(self.B) == 0 or self.playedAmount < len(self.B):
+            return False
+        try:
+            factor = lin.cho_factor(self.A)
+        except lin.LinAlgError:
+            return False
+        pivots = np.abs(np.diag(factor[0])) ** 2
+        if pivots.min() <= 1e-10 * pivots.max():
+            return False
+        self.Ainv = lin.cho_solve(factor , np.eye(len(self.B)))
+        self.oprs = self.Ainv @ self.B
+        self.solved = True
+        return True
+
+    def refactor(self):
+        """
+            Solves the normal equations from scratch, also clears any round off built up by rank 1 updates
+        """
+        if self._factor():
+            return
+        played = np.diag(self.A) > 0
+        self.oprs = np.full(len(self.B) , np.nan)
+        if played.any():
+            self.oprs[played] = lin.lstsq(self.A[np.ix_(played , played)] , self.B[played] , cond = 1e-10)[0]
+        self.solved = True
+
+    def getOprs(self):
+        if not self.solved:
+            self.refactor()
+        return self.oprs.copy()
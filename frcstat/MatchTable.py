@@ -0,0 +1,104 @@
+import numpy as np
+
+STATIONS = ("B1" , "B2" , "B3" , "R1" , "R2" , "R3")
+RED = 1
+BLUE = 2
+_WINNERS = {"red" : RED , "blue" : BLUE}
+BREAKDOWN_PREFIX = "score_breakdown_"
+
+class MatchTable:
+    """
+        An event's matchData converted once into columns, one row per match in matchData order, so per metric work
+        is array indexing instead of walking the match dicts again.
+
+        self.keys - match key of every row, self.rowIndex - match key -> row
+        self.lookup - team key -> team index the station columns hold
+        self.table - structured array with the fields
+            comp_level - "qm" , "ef" , "qf" , "sf" or "f"
+            set_number , match_number
+            B1 , B2 , B3 , R1 , R2 , R3 - team index of every station, -1 for teams missing from lookup
+            BS , RS - blue and red score
+            winner - RED , BLUE or 0 (no winning_alliance)
+            one float field per numeric score_breakdown value, named like flattenDictionary names it
+                ("score_breakdown_red_autoPoints"), NaN in matches without it
+        self.breakdownFields - names of those score_breakdown fields.
+                               Values that aren't numeric in every match they appear in don't get a field.
+        self.teamIndex - inverted index, team key -> (rows , colors , stations) arrays of every match the team played,
+                         colors holding RED or BLUE and stations the 1 based position in the alliance.
+                         Covers every team in the match data, also the ones missing from lookup.
+    """
+    def __init__(self , matchData , lookup):
+        self.keys = list(matchData)
+        self.rowIndex = {self.keys[i] : i for i in range(len(self.keys))}
+        self.lookup = lookup
+        matchAmount = len(self.keys)
+
+        base = {"comp_level" : [] , "set_number" : [] , "match_number" : [] , "BS" : [] , "RS" : [] , "winner" : []}
+        stations = np.full((matchAmount , len(STATIONS)) , -1 , dtype = np.intp)
+        breakdown = {} #flattened name -> (rows , values)
+        teamEntries = {} #team key -> [(row , color , station)]
+        for row in range(matchAmount):
+            match = matchData[self.keys[row]]
+            base["comp_level"].append(match["comp_level"])
+            base["set_number"].append(match.get("set_number") or 0)
+            base["match_number"].append(match["match_number"])
+            base["BS"].append(match["alliances"]["blue"]["score"])
+            base["RS"].append(match["alliances"]["red"]["score"])
+            base["winner"].append(_WINNERS.get(match.get("winning_alliance") , 0))
+            for color , offset in (("blue" , 0) , ("red" , 3)):
+                teamKeys = match["alliances"][color]["team_keys"]
+                for i in range(min(3 , len(teamKeys))):
+                    stations[row , offset + i] = lookup.get(teamKeys[i] , -1)
+                for i in range(len(teamKeys)):
+                    teamEntries.setdefault(teamKeys[i] , []).append((row , RED if color == "red" else BLUE , i + 1))
+            if type(match.get("score_breakdown")) == dict:
+                self._collectBreakdown(match["score_breakdown"] , BREAKDOWN_PREFIX , row , breakdown)
+
+        self.teamIndex = {}
+        for team in teamEntries:
+            entries = np.array(teamEntries[team] , dtype = np.intp).reshape(-1 , 3)
+            self.teamIndex[team] = (entries[: , 0] , entries[: , 1].astype(np.int8) , entries[: , 2].astype(np.int8))
+
+        self.breakdownFields = []
+        columns = {}
+        for name in breakdown:
+            if any(value is None for value in breakdown[name][1]): #numpy would quietly turn these into NaN
+                continue
+            try:
+                values = np.array(breakdown[name][1] , dtype = float)
+            except (ValueError , TypeError):
+                continue
+            if values.ndim != 1: #lists of numbers
+                continue
+            columns[name] = (np.array(breakdown[name][0] , dtype = np.intp) , values)
+            self.breakdownFields.append(name)
+
+        dtype = [("comp_level" , "U2") , ("set_number" , np.int32) , ("match_number" , np.int32)]
+        dtype += [(station , np.intp) for station in STATIONS]
+        dtype += [("BS" , float) , ("RS" , float) , ("winner" , np.int8)]
+        dtype += [(name , float) for name in self.breakdownFields]
+        self.table = np.zeros(matchAmount , dtype = dtype)
+        for name in base:
+            self.table[name] = base[name]
+        for i in range(len(STATIONS)):
+            self.table[STATIONS[i]] = stations[: , i]
+        for name in self.breakdownFields:
+            self.table[name] = np.nan
+            self.table[name][columns[name][0]] = columns[name][1]
+
+    def _collectBreakdown(self , inDict , prefix , row , breakdown):
+        for k in inDict:
+            if type(inDict[k]) == dict:
+                self._collectBreakdown(inDict[k] , prefix + k + "_" , row , breakdown)
+            else:
+                rows , values = breakdown.setdefault(prefix + k , ([] , []))
+                rows.append(row)
+                values.append(inDict[k])
+
+    def getTeamRows(self , team):
+        """
+            Returns (rows , colors , stations) of every match team played, in row order (see self.teamIndex)
+        """
+        if team not in self.teamIndex:
+            return np.zeros(0 , dtype = np.intp) , np.zeros(0 , dtype = np.int8) , np.zeros(0 , dtype = np.int8)
+        return self.teamIndex[team]
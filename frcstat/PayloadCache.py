@@ -0,0 +1,59 @@
+import threading
+from collections import OrderedDict
+
+class PayloadCache:
+    """
+        Bounded LRU of decoded payloads, used by TBA_Client so repeated reads of the same cache entry skip json decoding.
+
+        Entries are stored with a token describing the version they were decoded from (file mtime and size, sqlite data version).
+        A lookup with a different token is a miss, so entries go stale on their own when the underlying data changes.
+        Size is tracked in encoded bytes and the least recently used entries are dropped once maxBytes is passed.
+
+        Cached objects are shared between every caller and must be treated as read only.
+    """
+    def __init__(self , maxBytes = 64 * 1024 * 1024):
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        self.currentBytes = 0
+        self._entries = OrderedDict() #key -> (token , value , size)
+        self._lock = threading.Lock()
+
+    def get(self , key , token):
+        """
+            Returns (True , value) on a hit, (False , None) on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != token:
+                self.misses += 1
+                return False , None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True , entry[1]
+
+    def put(self , key , token , value , size):
+        if size > self.maxBytes:
+            self.invalidate(key)
+            return
+        with self._lock:
+            if key in self._entries:
+                self.currentBytes -= self._entries.pop(key)[2]
+            self._entries[key] = (token , value , size)
+            self.currentBytes += size
+            while self.currentBytes > self.maxBytes:
+                self.currentBytes -= self._entries.popitem(last = False)[1][2]
+
+    def invalidate(self , key):
+        with self._lock:
+            if key in self._entries:
+                self.currentBytes -= self._entries.pop(key)[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.currentBytes = 0
+
+    def getStats(self):
+        with self._lock:
+            return {"hits" : self.hits , "misses" : self.misses , "entries" : len(self._entries) , "bytes" : self.currentBytes}
@@ -0,0 +1,169 @@
+import json
+from .Compression import encodePayload, decompressPayload, getCompression
+import sqlite3
+import threading
+
+VALIDITY_SUFFIX = "-valid"
+
+class SQLiteStore:
+    """
+        Single file cache store used by TBA_Client in place of the localData/{teams,events,seasons} JSON files.
+
+        Payloads live in the payloads table, keyed by (kind , name) where kind is "teams" , "events" or "seasons"
+        and name is the same name the JSON file would have had.
+        Validity objects ("<code>-valid") are split into one row per request in the validators table,
+        so Last-Modified values are indexed instead of stored as a blob.
+        Binary objects (TBA_Client.writeEventArrays) are stored as is in the blobs table, under the same (kind , name) keys.
+        Every write is its own transaction.
+
+        payloadCache - optional PayloadCache of decoded reads. Entries are tokened with sqlite's data_version (changes when
+                       another connection commits) and a count of writes through this store (our own commits don't change data_version).
+        compression - None , "zlib" or "lzma", format payloads are written in. Reads detect the format of each row.
+    """
+    def __init__(self , path , payloadCache = None , compression = None):
+        self.path = path
+        self.payloadCache = payloadCache
+        self.compression = compression
+        self._lock = threading.Lock()
+        self._writes = 0 #bumped under _lock by every write, part of the payloadCache token
+        self.connection = sqlite3.connect(path , timeout = 30 , check_same_thread = False)
+        with self._lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS payloads (kind TEXT NOT NULL , name TEXT NOT NULL , data TEXT NOT NULL , PRIMARY KEY (kind , name)) WITHOUT ROWID")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS blobs (kind TEXT NOT NULL , name TEXT NOT NULL , data BLOB NOT NULL , PRIMARY KEY (kind , name)) WITHOUT ROWID")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS validators (kind TEXT NOT NULL , owner TEXT NOT NULL , dataName TEXT NOT NULL , lastModified TEXT , PRIMARY KEY (kind , owner , dataName)) WITHOUT ROWID")
+
+    def _isValidityName(self , name):
+        return name.endswith(VALIDITY_SUFFIX)
+
+    def _token(self):
+        """
+            Call with _lock held, so the token and whatever is read in the same hold of the lock belong together
+        """
+        return (self.connection.execute("PRAGMA data_version").fetchone()[0] , self._writes)
+
+    def read(self , kind , name):
+        """
+            Returns the decoded payload stored under kind/name, None if it doesn't exist
+        """
+        if self.payloadCache is not None:
+            with self._lock:
+                token = self._token()
+            found , out = self.payloadCache.get((kind , name) , token)
+            if found:
+                return out
+        size = 0
+        if self._isValidityName(name):
+            with self._lock:
+                token = self._token()
+                out = self._readValidity(kind , name[:-len(VALIDITY_SUFFIX)])
+            if out is not None:
+                size = sum(len(k) + len(v or "") for k , v in out.items())
+        else:
+            with self._lock:
+                token = self._token()
+                row = self.connection.execute("SELECT data FROM payloads WHERE kind = ? AND name = ?" , (kind , name)).fetchone()
+            if row is None:
+                return None
+            raw = decompressPayload(row[0])
+            out = json.loads(raw)
+            size = len(raw)
+        if self.payloadCache is not None and out is not None:
+            self.payloadCache.put((kind , name) , token , out , size)
+        return out
+
+    def write(self , kind , name , data):
+        if self._isValidityName(name):
+            success = self.writeValidity(kind , name[:-len(VALIDITY_SUFFIX)] , data)
+        else:
+            encoded = encodePayload(data , self.compression)
+            if self.compression is None:
+                encoded = encoded.decode("utf-8")
+            with self._lock, self.connection:
+                self.connection.execute("INSERT OR REPLACE INTO payloads (kind , name , data) VALUES (? , ? , ?)" , (kind , name , encoded))
+                self._writes += 1
+            success = True
+        #The write count already makes the entry stale, dropping it frees the memory
+        if self.payloadCache is not None:
+            self.payloadCache.invalidate((kind , name))
+        return success
+
+    def readMatching(self , kind , pattern):
+        """
+            pattern - glob style pattern on the payload name, ie "2018*-matches"
+
+            Returns dict of name -> decoded payload for every match, in a single query.
+            Validity objects ("<code>-valid") matching the pattern are included, like the JSON file backend does.
+        """
+        with self._lock:
+            rows = self.connection.execute("SELECT name , data FROM payloads WHERE kind = ? AND name GLOB ?" , (kind , pattern)).fetchall()
+            validityRows = self.connection.execute("SELECT owner , dataName , lastModified FROM validators WHERE kind = ? AND owner || ? GLOB ?" , (kind , VALIDITY_SUFFIX , pattern)).fetchall()
+        out = {name : json.loads(decompressPayload(data)) for name , data in rows}
+        for owner , dataName , lastModified in validityRows:
+            out.setdefault(owner + VALIDITY_SUFFIX , {})[dataName] = lastModified
+        return out
+
+    def readBlob(self , kind , name):
+        """
+            Returns the bytes stored under kind/name by writeBlob, None if they don't exist
+        """
+        with self._lock:
+            row = self.connection.execute("SELECT data FROM blobs WHERE kind = ? AND name = ?" , (kind , name)).fetchone()
+        return None if row is None else bytes(row[0])
+
+    def writeBlob(self , kind , name , data):
+        with self._lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO blobs (kind , name , data) VALUES (? , ? , ?)" , (kind , name , sqlite3.Binary(data)))
+            self._writes += 1
+        return True
+
+    def readValidity(self , kind , owner):
+        with self._lock:
+            return self._readValidity(kind , owner)
+
+    def _readValidity(self , kind , owner):
+        rows = self.connection.execute("SELECT dataName , lastModified FROM validators WHERE kind = ? AND owner = ?" , (kind , owner)).fetchall()
+        if len(rows) == 0:
+            return None
+        return {dataName : lastModified for dataName , lastModified in rows}
+
+    def writeValidity(self , kind , owner , validityData):
+        rows = [(kind , owner , dataName , validityData[dataName]) for dataName in validityData]
+        with self._lock, self.connection:
+            self.connection.execute("DELETE FROM validators WHERE kind = ? AND owner = ?" , (kind , owner))
+            self.connection.executemany("INSERT INTO validators (kind , owner , dataName , lastModified) VALUES (? , ? , ? , ?)" , rows)
+            self._writes += 1
+        return True
+
+    def compact(self , compression):
+        """
+            Rewrites every payload not already stored with compression in it, then VACUUMs the file.
+            Returns (payloads converted , bytes before , bytes after) of the payload data
+        """
+        converted = 0
+        bytesBefore = 0
+        bytesAfter = 0
+        with self._lock, self.connection:
+            rows = self.connection.execute("SELECT kind , name , data FROM payloads").fetchall()
+            for kind , name , data in rows:
+                stored = data.encode("utf-8") if isinstance(data , str) else data
+                bytesBefore += len(stored)
+                if getCompression(stored) == compression:
+                    bytesAfter += len(stored)
+                    continue
+                encoded = encodePayload(json.loads(decompressPayload(stored)) , compression)
+                bytesAfter += len(encoded)
+                if compression is None:
+                    encoded = encoded.decode("utf-8")
+                self.connection.execute("UPDATE payloads SET data = ? WHERE kind = ? AND name = ?" , (encoded , kind , name))
+                converted += 1
+            self._writes += 1
+        with self._lock:
+            self.connection.execute("VACUUM")
+        if self.payloadCache is not None:
+            self.payloadCache.clear()
+        return converted , bytesBefore , bytesAfter
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
@@ -1,6 +1,13 @@
+import bisect
+import pickle
+import numpy as np
+import scipy.sparse as sparse
 from collections import defaultdict
-from copy import copy
+from concurrent.futures import ProcessPoolExecutor
+from .Event import getEvent, _solveSparseLeastSquares, _Event_Set_TBA_Client, ELIM_ROUNDS
+from .Team import _Team_Set_TBA_Client
 from .ObjectShare import ObjectShare
+from .ValiditySession import ValiditySession
 
 _Singleton_TBA_Client = None
 
@@ -10,10 +17,17 @@ class Season:
         '''
             Data Loaded from TBA
                 self.events
+
+            Derived Data
+                self.seasonOPRFailures - event key -> the exception loading it raised, from the last getSeasonOPRS call
         '''
         self.year = year
+        self.seasonOPRFailures = {}
         self.validityFile = str(year) + "-valid"
-        self._old_validity_data = None
+        self.cacheRefreshAggression = cacheRefreshAggression
+        self.validity = ValiditySession(lambda : _Singleton_TBA_Client.readSeasonData(self.validityFile) ,
+                                        lambda validityData : _Singleton_TBA_Client.writeSeasonData(self.validityFile , validityData) ,
+                                        lambda : _Singleton_TBA_Client.lockData("seasons" , self.validityFile))
         self.loadData(cacheRefreshAggression)
         
 
@@ -25,77 +39,397 @@ class Season:
         '''
         Generator
         '''
-        for event in self.events:
-            if event["event_type"] == 99:
-                yield event
+        for event in self.catalog.getByTypes([99]):
+            yield event
         
     def getOffseasonEvents(self):
         return [x for x in self.offSeasonEvents()]
         
     def officialEvents(self):
-        for event in self.events:
-            if event["event_type"] in [0 , 1  , 2 , 3 , 4 , 5 , 6]:
-                yield event
+        for event in self.catalog.getByTypes([0 , 1  , 2 , 3 , 4 , 5 , 6]):
+            yield event
     
     def getOfficialEvents(self):
         return [x for x in self.officialEvents()]
         
     def oprableEvents(self):
-        for event in self.events:
-            if event["event_type"] in [0 , 1 , 2 , 3 , 5]:
-                yield event
+        for event in self.catalog.getByTypes([0 , 1 , 2 , 3 , 5]):
+            yield event
         
     def getLowLevelEvents(self):
         """
             Low Level Events defined as regional and district events
         """
-        out = []
-        for event in self.events:
-            if event["event_type"] == 0 or event["event_type"] == 1:
-                out.append(event)
-        return out
+        return self.catalog.getByTypes([0 , 1])
         
     def getPreseasonEvents(self):
-        out = []
-        for event in self.events:
-            if event["event_type"] == 100:
-                out.append(event)
-        return out
+        return self.catalog.getByTypes([100])
         
     def getDistrictChampionshipEvents(self):
-        out = []
-        for event in self.events:
-            if event["event_type"] == 2:
-                out.append(event)
-        return out
+        return self.catalog.getByTypes([2])
     
     def getChampionshipEvents(self):
-        out = []
-        for event in self.events:
-            if event["event_type"] in [3,4,6]:
-                out.append(event)
-        return out
+        return self.catalog.getByTypes([3 , 4 , 6])
 
     def getDivisionEvents(self):
-        out = []
-        for event in self.events:
-            if event["event_type"] == 3:
-                out.append(event)
-        return out
+        return self.catalog.getByTypes([3])
+
+    def getEventData(self , eventKey):
+        """
+            Returns the season's event dict of eventKey, None if the season has no such event
+        """
+        return self.catalog.getByKey(eventKey)
+
+    def findEvents(self , eventTypes = None , weeks = None , districts = None , states = None , countries = None ,
+                   startDate = None , endDate = None , cacheRefreshAggression = None):
+        """
+            Returns lazy handles (see _Event_Handle) of the events matching every filter given, in self.events order
+            Filters take one value or a list of values, any of which may match
+
+            eventTypes - TBA event_type, ie 0 for regionals
+            weeks - TBA week (0 based), [None] for events without one
+            districts - district abbreviation, ie "fim"
+            states , countries - state_prov and country, ie "MI" , "USA" (case insensitive)
+            startDate , endDate - "YYYY-MM-DD", events starting within the range (inclusive)
+            cacheRefreshAggression - used when a handle loads its Event, defaults to the season's
+        """
+        if cacheRefreshAggression is None:
+            cacheRefreshAggression = self.cacheRefreshAggression
+        indices = self.catalog.find(eventTypes , weeks , districts , states , countries , startDate , endDate)
+        return [_Event_Handle(self.events[i] , cacheRefreshAggression) for i in indices]
+
+    def getSeasonOPRS(self , eventOffsets = False , weekDecay = None , cacheRefreshAggression = None):
+        '''
+            Joint OPR over every played qual match of every oprableEvents() event, solved as one sparse least squares system
+            so a team's rating is fit against every alliance it played on all season instead of one event at a time
+
+            eventOffsets - adds one unknown per event, a score offset every alliance at that event gets.
+                           Soaks up differences in scoring between events (field, refs, level of play) the team ratings would take otherwise.
+                           Offsets are held to sum to 0 so the ratings keep the scale of regular OPR
+            weekDecay - None or a factor in (0 , 1]. Matches are weighted by weekDecay ** (weeks before the last week),
+                        so late season play counts more. Championship events (no week) count as the week after the last
+            cacheRefreshAggression - used to load the events, defaults to the season's
+
+            Returns dict of team key -> rating
+            Events that fail to load are left out of the fit and kept in self.seasonOPRFailures (event key -> the exception)
+        '''
+        if cacheRefreshAggression is None:
+            cacheRefreshAggression = self.cacheRefreshAggression
+        self.seasonOPRFailures = {}
+        events = list(self.oprableEvents())
+        weeks = [event["week"] for event in events if event["week"] is not None]
+        lastWeek = max(weeks) + 1 if weeks else 0
+
+        teamIndex = {}
+        columns = []
+        scores = []
+        weights = []
+        eventColumns = []
+        for event in events:
+            try:
+                fevent = getEvent(event["key"] , cacheRefreshAggression)
+                matchKeys , red , blue , redScore , blueScore = fevent._getQualAllianceArrays()
+                teamList = fevent.getTeamList()
+            except Exception as e:
+                self.seasonOPRFailures[event["key"]] = e
+                continue
+            if len(matchKeys) == 0:
+                continue
+            globalIndex = np.array([teamIndex.setdefault(t , len(teamIndex)) for t in teamList] , dtype = np.intp)
+            columns.append(globalIndex[np.concatenate((red , blue))])
+            scores.append(np.concatenate((redScore , blueScore)))
+            week = event["week"] if event["week"] is not None else lastWeek
+            weight = 1.0 if weekDecay is None else weekDecay ** (lastWeek - week)
+            weights.append(np.full(2 * len(matchKeys) , weight))
+            eventColumns.append(np.full(2 * len(matchKeys) , len(eventColumns)))
+        if len(columns) == 0:
+            return {}
+
+        columns = np.concatenate(columns)
+        rowScale = np.sqrt(np.concatenate(weights)) #weighted least squares, every row scaled by sqrt(weight)
+        B = np.concatenate(scores) * rowScale
+        rowAmount = len(columns)
+        rows = np.repeat(np.arange(rowAmount) , 3)
+        cols = columns.ravel()
+        values = np.repeat(rowScale , 3)
+        variableAmount = len(teamIndex)
+        if eventOffsets:
+            #The offsets and ratings can trade a constant between them without changing the fit,
+            #the last row pins that direction down by asking the offsets to sum to 0
+            eventColumns = np.concatenate(eventColumns) + variableAmount
+            rows = np.concatenate((rows , np.arange(rowAmount) , np.full(len(scores) , rowAmount)))
+            cols = np.concatenate((cols , eventColumns , variableAmount + np.arange(len(scores))))
+            values = np.concatenate((values , rowScale , np.ones(len(scores))))
+            B = np.append(B , 0)
+            rowAmount += 1
+            variableAmount += len(scores)
+        A = sparse.csr_matrix((values , (rows , cols)) , shape = (rowAmount , variableAmount))
+        ratings = _solveSparseLeastSquares(A , B)
+        return {t : ratings[teamIndex[t]] for t in teamIndex}
+
+    def computeEventMetrics(self , metrics = ("opr" ,) , events = None , processes = None , cacheRefreshAggression = None):
+        '''
+            Computes metrics for many events at once, spread over a pool of processes (one event per job)
+
+            metrics - iterable of
+                "opr"  - Event.getArrayOPRS()
+                "copr" - Event.getComponentOPRS(), one label per score_breakdown key
+                any other string is a scoreMetricFromPattern pattern, one label per pattern suffix
+            events - event keys, defaults to every oprableEvents() event
+            processes - size of the pool, defaults to the amount of cores
+            cacheRefreshAggression - used by the workers to load the events, defaults to the season's.
+                                     Workers read and write the same local cache as this process.
+
+            Returns dict
+                "events"   - keys of the events that succeeded
+                "teams"    - every team key that played at one of them
+                "labels"   - metric -> list of labels ("" for opr)
+                "values"   - metric -> (events , teams , labels) float array, NaN where a team didn't play the event
+                "failures" - event key -> the exception its job raised
+        '''
+        metrics = list(metrics)
+        if events is None:
+            events = [event["key"] for event in self.oprableEvents()]
+        if cacheRefreshAggression is None:
+            cacheRefreshAggression = self.cacheRefreshAggression
+
+        results = {}
+        failures = {}
+        with ProcessPoolExecutor(processes , initializer = _initMetricWorker , initargs = (pickle.dumps(_Singleton_TBA_Client) ,)) as executor:
+            futures = {eventKey : executor.submit(_computeEventMetrics , eventKey , metrics , cacheRefreshAggression) for eventKey in events}
+            for eventKey in events:
+                try:
+                    results[eventKey] = futures[eventKey].result()
+                except Exception as e:
+                    failures[eventKey] = e
+
+        eventKeys = [eventKey for eventKey in events if eventKey in results]
+        teamIndex = {}
+        labelIndex = {metric : {} for metric in metrics}
+        for eventKey in eventKeys:
+            teamList , eventMetrics = results[eventKey]
+            for t in teamList:
+                teamIndex.setdefault(t , len(teamIndex))
+            for metric in metrics:
+                for label in eventMetrics[metric][0]:
+                    labelIndex[metric].setdefault(label , len(labelIndex[metric]))
+
+        values = {}
+        for metric in metrics:
+            values[metric] = np.full((len(eventKeys) , len(teamIndex) , len(labelIndex[metric])) , np.nan)
+            for i in range(len(eventKeys)):
+                teamList , eventMetrics = results[eventKeys[i]]
+                labels , metricValues = eventMetrics[metric]
+                teams = np.array([teamIndex[t] for t in teamList] , dtype = np.intp)
+                columns = np.array([labelIndex[metric][label] for label in labels] , dtype = np.intp)
+                values[metric][i][np.ix_(teams , columns)] = metricValues
+        return {"events" : eventKeys ,
+                "teams" : list(teamIndex) ,
+                "labels" : {metric : list(labelIndex[metric]) for metric in metrics} ,
+                "values" : values ,
+                "failures" : failures}
+
+    def getElimStats(self , events = None , cacheRefreshAggression = None):
+        '''
+            Playoff stats of every team at every event, one Event.getElimStats pass per event (events are shared through getEvent)
+
+            events - event keys, defaults to every officialEvents() event
+            cacheRefreshAggression - used to load the events, defaults to the season's
+
+            Returns dict
+                "events" - keys of the events that loaded
+                "teams" - every team key at one of them
+                "attended" - (teams , events) bool array, team is in the event's team list or played its playoffs
+                "playoffWins" , "seriesWins" - (teams , events) int arrays
+                "furthestRound" - (teams , events) int array, index in "rounds" of the furthest round reached, -1 for no playoffs
+                "rounds" - ELIM_ROUNDS followed by "winner"
+                "failures" - event key -> the exception loading it raised
+        '''
+        if events is None:
+            events = [event["key"] for event in self.officialEvents()]
+        if cacheRefreshAggression is None:
+            cacheRefreshAggression = self.cacheRefreshAggression
+
+        eventKeys = []
+        eventStats = []
+        failures = {}
+        teamIndex = {}
+        for eventKey in events:
+            try:
+                fevent = getEvent(eventKey , cacheRefreshAggression)
+                stats = fevent.getElimStats()
+                teamList = fevent.getTeamList() or []
+            except Exception as e:
+                failures[eventKey] = e
+                continue
+            for t in list(teamList) + list(stats):
+                teamIndex.setdefault(t , len(teamIndex))
+            eventKeys.append(eventKey)
+            eventStats.append((teamList , stats))
+
+        shape = (len(teamIndex) , len(eventKeys))
+        attended = np.zeros(shape , dtype = bool)
+        playoffWins = np.zeros(shape , dtype = np.int32)
+        seriesWins = np.zeros(shape , dtype = np.int32)
+        furthestRound = np.full(shape , -1 , dtype = np.int8)
+        for e in range(len(eventKeys)):
+            teamList , stats = eventStats[e]
+            attended[[teamIndex[t] for t in teamList] , e] = True
+            for t in stats:
+                i = teamIndex[t]
+                attended[i , e] = True
+                playoffWins[i , e] = stats[t]["playoff_wins"]
+                seriesWins[i , e] = stats[t]["series_wins"]
+                furthestRound[i , e] = stats[t]["furthest_round"]
+        return {"events" : eventKeys ,
+                "teams" : list(teamIndex) ,
+                "attended" : attended ,
+                "playoffWins" : playoffWins ,
+                "seriesWins" : seriesWins ,
+                "furthestRound" : furthestRound ,
+                "rounds" : list(ELIM_ROUNDS) + ["winner"] ,
+                "failures" : failures}
 
     def getComponentOPRLabels(self):
         pass
         
+    def readValidityData(self):
+        return self.validity.read()
+
+    def writeValidityData(self, validityData):
+        return self.validity.write(validityData) #Write validity object to file
+
     def loadData(self , cacheRefreshAggression):
-        validityData = _Singleton_TBA_Client.dictToDefaultDict(_Singleton_TBA_Client.readSeasonData(self.validityFile) , lambda:None)
-        self._old_validity_data = copy(validityData)
+        validityData = self.readValidityData()
         
         eventObjName = "{}-data".format(str(self.year))
         eventRequest = "events/{}".format(str(self.year))
         self.events = _Singleton_TBA_Client.makeSmartRequest(eventObjName , eventRequest , validityData , self , cacheRefreshAggression)
+        self.catalog = _Event_Catalog(self.events or [])
             
-        if self._old_validity_data != validityData:
-            _Singleton_TBA_Client.writeSeasonData(self.validityFile , validityData) #Write validity object to file
+        self.writeValidityData(validityData)
+
+
+class _Event_Catalog:
+    """
+        Indexes of a season's events, built once when the events are loaded.
+        Every index maps a value to the positions (in events order) of the events having it, so lookups cost O(result).
+        The value every event has in each index is kept by position as well, so a position is checked against a filter in O(1).
+    """
+    def __init__(self , events):
+        self.events = events
+        self.byKey = {}
+        self.byType = defaultdict(list)
+        self.byWeek = defaultdict(list)
+        self.byDistrict = defaultdict(list)
+        self.byState = defaultdict(list)
+        self.byCountry = defaultdict(list)
+        self.types = []
+        self.weeks = []
+        self.districts = []
+        self.states = []
+        self.countries = []
+        starts = []
+        for i in range(len(events)):
+            event = events[i]
+            district = event.get("district")
+            self.byKey[event["key"]] = i
+            self.types.append(event.get("event_type"))
+            self.weeks.append(event.get("week"))
+            self.districts.append(district["abbreviation"].lower() if district else None)
+            self.states.append(self._lower(event.get("state_prov")))
+            self.countries.append(self._lower(event.get("country")))
+            self.byType[self.types[i]].append(i)
+            self.byWeek[self.weeks[i]].append(i)
+            self.byDistrict[self.districts[i]].append(i)
+            self.byState[self.states[i]].append(i)
+            self.byCountry[self.countries[i]].append(i)
+            if event.get("start_date"):
+                starts.append((event["start_date"] , i))
+        starts.sort()
+        self.startDates = [start for start , i in starts]
+        self.startIndices = [i for start , i in starts]
+        self.startRanks = [None] * len(events) #position of every event in startDates
+        for rank in range(len(self.startIndices)):
+            self.startRanks[self.startIndices[rank]] = rank
+
+    def _lower(self , value):
+        return value.lower() if isinstance(value , str) else value
+
+    def _lookup(self , index , values , normalize = False):
+        if values is None or isinstance(values , (str , int)):
+            values = [values]
+        out = []
+        for value in values:
+            out.extend(index.get(self._lower(value) if normalize else value , []))
+        return out
+
+    def _indexFilter(self , index , positionValues , values , normalize = False):
+        """
+            Returns (candidate amount , function returning the candidate positions , test of one position) of an index filter
+        """
+        if values is None or isinstance(values , (str , int)):
+            values = [values]
+        values = set(self._lower(value) if normalize else value for value in values)
+        amount = sum(len(index.get(value , ())) for value in values)
+        return (amount , lambda : self._lookup(index , values) , lambda i : positionValues[i] in values)
+
+    def getByKey(self , eventKey):
+        i = self.byKey.get(eventKey)
+        return None if i is None else self.events[i]
+
+    def getByTypes(self , eventTypes):
+        return [self.events[i] for i in sorted(self._lookup(self.byType , eventTypes))]
+
+    def find(self , eventTypes = None , weeks = None , districts = None , states = None , countries = None , startDate = None , endDate = None):
+        """
+            Returns the sorted positions of the events matching every filter given, see Season.findEvents
+            Only the candidates of the most selective filter are listed, the other filters test those one position at a time,
+            so a lookup costs O(smallest candidate list) whatever the size of the others
+        """
+        filters = []
+        if eventTypes is not None:
+            filters.append(self._indexFilter(self.byType , self.types , eventTypes))
+        if weeks is not None:
+            filters.append(self._indexFilter(self.byWeek , self.weeks , weeks))
+        if districts is not None:
+            filters.append(self._indexFilter(self.byDistrict , self.districts , districts , True))
+        if states is not None:
+            filters.append(self._indexFilter(self.byState , self.states , states , True))
+        if countries is not None:
+            filters.append(self._indexFilter(self.byCountry , self.countries , countries , True))
+        if startDate is not None or endDate is not None:
+            low = 0 if startDate is None else bisect.bisect_left(self.startDates , startDate)
+            high = len(self.startDates) if endDate is None else bisect.bisect_right(self.startDates , endDate)
+            filters.append((max(high - low , 0) , lambda : self.startIndices[low:high] ,
+                            lambda i : self.startRanks[i] is not None and low <= self.startRanks[i] < high))
+        if len(filters) == 0:
+            return list(range(len(self.events)))
+        filters.sort(key = lambda f : f[0])
+        tests = [f[2] for f in filters[1:]]
+        return sorted(i for i in filters[0][1]() if all(test(i) for test in tests))
+
+
+class _Event_Handle:
+    """
+        Event returned by Season.findEvents that is only loaded (through getEvent) when first used.
+        key and data (the season's event dict) are available without loading, every other attribute is the Event's.
+    """
+    def __init__(self , data , cacheRefreshAggression):
+        self.key = data["key"]
+        self.data = data
+        self.cacheRefreshAggression = cacheRefreshAggression
+
+    def get(self):
+        return getEvent(self.key , self.cacheRefreshAggression)
+
+    def __getattr__(self , name):
+        if name.startswith("__"): #copy and pickle probe these before __init__ has run
+            raise(AttributeError(name))
+        return getattr(self.get() , name)
+
+    def __repr__(self):
+        return "_Event_Handle({})".format(self.key)
 
 
 _seasonShare = ObjectShare(Season)
@@ -104,6 +438,37 @@ _seasonShare = ObjectShare(Season)
 def getSeason(year, cacheRefreshAggression = 1):
     return _seasonShare.get(year, cacheRefreshAggression)
 
+def _initMetricWorker(clientState):
+    """
+        Process pool initializer of Season.computeEventMetrics
+        Gives the worker its own client, forked workers would otherwise share the parent's connections
+    """
+    client = pickle.loads(clientState)
+    _Season_Set_TBA_Client(client)
+    _Event_Set_TBA_Client(client)
+    _Team_Set_TBA_Client(client)
+
+def _computeEventMetrics(eventKey , metrics , cacheRefreshAggression):
+    """
+        Process pool job of Season.computeEventMetrics
+        Returns (team list , dict of metric -> (labels , (teams , labels) array))
+    """
+    event = getEvent(eventKey , cacheRefreshAggression)
+    teamList = event.getTeamList()
+    out = {}
+    for metric in metrics:
+        if metric == "opr":
+            out[metric] = ([""] , np.reshape(event.getArrayOPRS() , (-1 , 1)))
+        elif metric == "copr":
+            coprs = event.getComponentOPRS()
+            labels = list(coprs)
+            out[metric] = (labels , np.column_stack([coprs[label] for label in labels]) if labels else np.zeros((len(teamList) , 0)))
+        else:
+            patternValues = event.scoreMetricFromPattern(metric)
+            labels = event._getPatternSuffixList(metric)
+            out[metric] = (labels , np.array([[patternValues[str(t) + label] for label in labels] for t in teamList] , dtype = float).reshape(-1 , len(labels)))
+    return teamList , out
+
 def _Season_Set_TBA_Client(client):
     global _Singleton_TBA_Client
     _Singleton_TBA_Client = client
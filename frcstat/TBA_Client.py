@@ -1,29 +1,114 @@
 import numpy as np
 import os
+import io
+import glob
 import json
 import urllib.parse
 import urllib.request
 import requests
+import requests.adapters
+import random
+import threading
+import time
+import tempfile
+import tarfile
+import zipfile
+import zlib
+import lzma
+from contextlib import contextmanager
 from collections import defaultdict
 import datetime
+from concurrent.futures import ThreadPoolExecutor, Future
+try:
+    import fcntl
+except ImportError: #Not available on Windows, per key locks become no-ops there
+    fcntl = None
 
 from .API_Keys import API_Keys
+from .SQLiteStore import SQLiteStore
+from .PayloadCache import PayloadCache
+from .Compression import COMPRESSIONS, encodePayload, decodePayload, decompressPayload, getCompression
 from .Event import Event
 from .Season import Season
 from .Team import Team
 
 class TBA_Client:
-    def __init__(self , tbakey = None):
+    RETRY_STATUS_CODES = (429 , 500 , 502 , 503 , 504)
+    LOCK_STRIPES = 256 #amount of lock files lockData spreads the cache keys over
+
+    def __init__(self , tbakey = None , maxRetries = 3 , backoffFactor = 0.5 , maxBackoff = 30 , requestsPerSecond = None , poolSize = 16 , timeout = 30 , cacheBackend = "json" , payloadCacheBytes = 64 * 1024 * 1024 , compression = None , cacheDir = None):
+        """
+            tbakey - TBA API key, read from the TBA_KEY environment variable if not given
+            maxRetries - how many times a request is retried after a 429/5xx response or connection error
+            backoffFactor - base of the exponential backoff (seconds) between retries, jittered
+            maxBackoff - cap (seconds) on a single backoff sleep
+            requestsPerSecond - client side rate limit shared by every request made through this client, None for no limit
+            poolSize - amount of keep-alive connections kept open to TBA
+            timeout - seconds before a request is abandoned (and retried)
+            cacheBackend - "json" stores every request in its own file under localData/
+                           "sqlite" stores everything in the single file localData/cache.sqlite
+            payloadCacheBytes - size of the in memory LRU of decoded cache entries, 0 to disable it
+            compression - None , "zlib" or "lzma". Format new cache entries are written in, reads detect the format on their own
+                          so existing plain JSON caches keep working. compactCache() converts an existing cache.
+            cacheDir - root directory of the local cache, defaults to localData/ inside the installed package
+        """
         self.saveDir = os.path.dirname(os.path.abspath(__file__))
-        self.localDataDir = os.path.join(self.saveDir , "localData")
+        self.localDataDir = os.path.join(self.saveDir , "localData") if cacheDir is None else os.path.abspath(cacheDir)
         self.teamDir   = os.path.join(self.localDataDir , "teams")
         self.eventDir  = os.path.join(self.localDataDir , "events")
         self.seasonDir = os.path.join(self.localDataDir , "seasons")
+        self.lockDir   = os.path.join(self.localDataDir , ".locks")
         
         self.keys = API_Keys(tbakey)
+        self._config = {"tbakey" : self.keys.getTBAKey() , "maxRetries" : maxRetries , "backoffFactor" : backoffFactor ,
+                        "maxBackoff" : maxBackoff , "requestsPerSecond" : requestsPerSecond , "poolSize" : poolSize , "timeout" : timeout ,
+                        "cacheBackend" : cacheBackend , "payloadCacheBytes" : payloadCacheBytes , "compression" : compression ,
+                        "cacheDir" : self.localDataDir}
         self.apiURL = r"https://www.thebluealliance.com/api/v3/"
+
+        self.maxRetries = maxRetries
+        self.backoffFactor = backoffFactor
+        self.maxBackoff = maxBackoff
+        self.timeout = timeout
+        self._rateLimiter = _Rate_Limiter(requestsPerSecond)
+        self.session = self._createSession(poolSize)
+        self._inFlight = {} #(kind , dataName , request , mutator code) -> Future of the fetch in progress
+        self._inFlightLock = threading.Lock()
         self.setup()
 
+        if compression not in COMPRESSIONS:
+            raise(Exception("Unknown compression {}".format(compression)))
+        self.compression = compression
+        self.payloadCache = PayloadCache(payloadCacheBytes)
+        self.store = None
+        if cacheBackend == "sqlite":
+            self.store = SQLiteStore(os.path.join(self.localDataDir , "cache.sqlite") , self.payloadCache , compression)
+        elif cacheBackend != "json":
+            raise(Exception("Unknown cacheBackend {}".format(cacheBackend)))
+
+    def __getstate__(self):
+        """
+            Sessions, locks and sqlite connections can't be pickled (or shared with another process),
+            so a pickled client is only its configuration. Unpickling builds a fresh client on the same cache.
+        """
+        return {"config" : self._config , "apiURL" : self.apiURL}
+
+    def __setstate__(self , state):
+        self.__init__(**state["config"])
+        self.apiURL = state["apiURL"]
+
+    def _createSession(self , poolSize):
+        """
+            Creates the persistent HTTP session every request goes through.
+            Connections are kept alive and pooled so repeated requests skip the TCP/TLS handshake.
+        """
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections = poolSize , pool_maxsize = poolSize)
+        session.mount("https://" , adapter)
+        session.mount("http://" , adapter)
+        session.headers.update({"Accept-Encoding" : "gzip, deflate"})
+        return session
+
     def setup(self):
         """
         Sets up directory paths for storing local data.
@@ -36,6 +121,8 @@ class TBA_Client:
             os.makedirs(self.eventDir)
         if not os.path.isdir(self.seasonDir):
             os.makedirs(self.seasonDir)
+        if not os.path.isdir(self.lockDir):
+            os.makedirs(self.lockDir)
             
     def dictToDefaultDict(self , obj , callable):
         out = defaultdict(callable)
@@ -46,20 +133,234 @@ class TBA_Client:
         return out
 
     def readData(self , fname):
+        """
+            Decoded files are kept in self.payloadCache, a file is only decoded again once its mtime or size changes.
+            The returned object may be shared with other callers and must not be mutated.
+        """
         out = None
-        if os.path.isfile(fname):
-            with open(fname) as fp:
-                try:
-                    out = json.loads(fp.read())
-                except json.decoder.JSONDecodeError:
-                    if __debug__:
-                        print(fname + " failed JSON decoding.")
+        try:
+            stat = os.stat(fname)
+        except FileNotFoundError:
+            self.payloadCache.invalidate(fname)
+            return out
+        token = (stat.st_mtime_ns , stat.st_size)
+        found , out = self.payloadCache.get(fname , token)
+        if found:
+            return out
+        with open(fname , 'rb') as fp:
+            try:
+                raw = decompressPayload(fp.read())
+                out = json.loads(raw)
+                self.payloadCache.put(fname , token , out , len(raw))
+            except (json.decoder.JSONDecodeError , zlib.error , lzma.LZMAError):
+                if __debug__:
+                    print(fname + " failed JSON decoding.")
+        return out
+
+    def writeData(self , fname , data):
+        """
+            Writes to a temporary file next to fname and renames it into place,
+            so readers (in any process) see either the old or the new file, never a partial one.
+            The file is compressed according to self.compression, but keeps its .json name.
+        """
+        return self._writeFile(fname , encodePayload(data , self.compression))
+
+    def _writeFile(self , fname , stored):
+        success = False
+        self.payloadCache.invalidate(fname)
+        fd , tempName = tempfile.mkstemp(dir = os.path.dirname(fname) , prefix = "." + os.path.basename(fname) , suffix = ".tmp")
+        try:
+            with os.fdopen(fd , 'wb') as fp:
+                fp.write(stored)
+                fp.flush()
+                os.fsync(fp.fileno())
+            os.replace(tempName , fname)
+            success = True
+        finally:
+            if not success:
+                os.remove(tempName)
+        return success
+
+    def _readKindDataMatching(self , kind , pattern):
+        if kind == "events":
+            return self.readEventDataMatching(pattern)
+        elif kind == "teams":
+            return self.readTeamDataMatching(pattern)
+        elif kind == "seasons":
+            return self.readSeasonDataMatching(pattern)
+
+    def _readKindData(self , kind , file):
+        if kind == "events":
+            return self.readEventData(file)
+        elif kind == "teams":
+            return self.readTeamData(file)
+        elif kind == "seasons":
+            return self.readSeasonData(file)
+
+    def _writeKindData(self , kind , file , data):
+        if kind == "events":
+            return self.writeEventData(file , data)
+        elif kind == "teams":
+            return self.writeTeamData(file , data)
+        elif kind == "seasons":
+            return self.writeSeasonData(file , data)
+
+    def exportCache(self , archivePath , years = None , events = None , teams = None):
+        """
+            archivePath - .tar.gz file to write
+            years - list of seasons to export, includes the season data and every event of those seasons
+            events - list of event keys to export
+            teams - list of team numbers or keys to export
+            If no scope is given, the whole cache is exported.
+
+            Packs cached payloads along with their validity data (Last-Modified values), so a cache imported
+            with importCache() keeps revalidating with If-Modified-Since instead of downloading everything again.
+
+            Returns amount of entries exported
+        """
+        patterns = []
+        if years is None and events is None and teams is None:
+            patterns = [("events" , "*") , ("teams" , "*") , ("seasons" , "*")]
+        for year in years or []:
+            patterns.append(("seasons" , "{}-*".format(year)))
+            patterns.append(("events" , "{}*".format(year)))
+        for event in events or []:
+            patterns.append(("events" , "{}-*".format(event)))
+        for team in teams or []:
+            number = str(team).replace("frc" , "")
+            patterns.append(("teams" , "frc{}-*".format(number)))
+            patterns.append(("teams" , "{}-valid".format(number)))
+
+        entries = {}
+        for kind , pattern in patterns:
+            for name , data in self._readKindDataMatching(kind , pattern).items():
+                entries["{}/{}.json".format(kind , name)] = data
+
+        with tarfile.open(archivePath , "w:gz") as tar:
+            for memberName in sorted(entries):
+                stored = encodePayload(entries[memberName])
+                info = tarfile.TarInfo(memberName)
+                info.size = len(stored)
+                info.mtime = time.time()
+                tar.addfile(info , io.BytesIO(stored))
+        return len(entries)
+
+    def importCache(self , archivePath , overwrite = True):
+        """
+            archivePath - archive written by exportCache()
+            overwrite - if False, entries already in the local cache are kept
+
+            Unpacks the archive into this client's cache (whatever its backend and compression).
+            Validity data is only merged for the payloads that were actually imported,
+            so a kept local payload is never paired with a Last-Modified value from the archive.
+
+            Returns amount of payloads imported
+        """
+        payloads = []
+        validity = []
+        with tarfile.open(archivePath , "r:*") as tar:
+            for member in tar:
+                parts = member.name.split("/")
+                if not member.isfile() or len(parts) != 2 or parts[0] not in ("events" , "teams" , "seasons") \
+                   or not parts[1].endswith(".json") or parts[1].startswith("."):
+                    continue
+                entry = (parts[0] , parts[1][:-len(".json")] , decodePayload(tar.extractfile(member).read()))
+                if entry[1].endswith("-valid"):
+                    validity.append(entry)
+                else:
+                    payloads.append(entry)
+
+        imported = set()
+        for kind , name , data in payloads:
+            with self.lockData(kind , name):
+                if not overwrite and self._readKindData(kind , name) is not None:
+                    continue
+                self._writeKindData(kind , name , data)
+                imported.add((kind , name))
+
+        for kind , name , data in validity:
+            with self.lockData(kind , name):
+                stored = dict(self._readKindData(kind , name) or {})
+                for dataName in data:
+                    if (kind , dataName) in imported:
+                        stored[dataName] = data[dataName]
+                self._writeKindData(kind , name , stored)
+        return len(imported)
+
+    def compactCache(self , compression = "default"):
+        """
+            compression - format to convert the cache to, defaults to the compression of this client
+
+            One shot migration of every cached payload (legacy plain JSON or another compression) into one format.
+            Entries already in that format are left alone.
+
+            Returns (entries converted , bytes before , bytes after)
+        """
+        if compression == "default":
+            compression = self.compression
+        if self.store is not None:
+            return self.store.compact(compression)
+        converted = 0
+        bytesBefore = 0
+        bytesAfter = 0
+        for kind , directory in [("events" , self.eventDir) , ("teams" , self.teamDir) , ("seasons" , self.seasonDir)]:
+            for fname in glob.glob(os.path.join(directory , "*.json")):
+                with self.lockData(kind , os.path.basename(fname)[:-len(".json")]):
+                    with open(fname , 'rb') as fp:
+                        stored = fp.read()
+                    bytesBefore += len(stored)
+                    if getCompression(stored) == compression:
+                        bytesAfter += len(stored)
+                        continue
+                    stored = encodePayload(json.loads(decompressPayload(stored)) , compression)
+                    self._writeFile(fname , stored)
+                    bytesAfter += len(stored)
+                    converted += 1
+        return converted , bytesBefore , bytesAfter
+
+    @contextmanager
+    def lockData(self , kind , file):
+        """
+            kind - "events" , "teams" or "seasons"
+            file - name of the data to lock
+
+            Advisory lock held by at most one thread or process sharing this localData directory.
+            Readers never need it since writes are atomic.
+            Keys are hashed onto a fixed set of LOCK_STRIPES lock files, so the lock directory doesn't grow with the cache.
+            Different keys sharing a stripe are serialized too, which costs some waiting but never deadlocks
+            as long as no caller holds two locks at once.
+        """
+        if fcntl is None:
+            yield
+            return
+        stripe = zlib.crc32("{}/{}".format(kind , file).encode("utf-8")) % self.LOCK_STRIPES #stable across processes, unlike hash()
+        with open(os.path.join(self.lockDir , "{:03d}.lock".format(stripe)) , 'a') as fp:
+            fcntl.flock(fp.fileno() , fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fp.fileno() , fcntl.LOCK_UN)
+
+    def getCacheStats(self):
+        """
+            Returns dict with the hits , misses , entries and bytes of the decoded payload cache
+        """
+        return self.payloadCache.getStats()
+
+    def _readDataMatching(self , directory , kind , pattern):
+        if self.store is not None:
+            return self.store.readMatching(kind , pattern)
+        out = {}
+        for fname in glob.glob(os.path.join(directory , pattern + ".json")):
+            out[os.path.basename(fname)[:-len(".json")]] = self.readData(fname)
         return out
     
     def readSeasonData(self , file):
         """
             file - File name in season/ .json will be appended
         """
+        if self.store is not None:
+            return self.store.read("seasons" , file)
         fname = os.path.join(self.seasonDir , file + ".json")
         return self.readData(fname)
         
@@ -68,17 +369,24 @@ class TBA_Client:
             file - File name in season/ .json will be appended
             data - Python data structure to be written to file (Will be converted to JSON object string)
         """
-        success = False
+        if self.store is not None:
+            return self.store.write("seasons" , file , data)
         fname = os.path.join(self.seasonDir , file + ".json")
-        with open(fname , 'w') as fp:
-            fp.write(json.dumps(data))
-            success = True
-        return success
+        return self.writeData(fname , data)
+
+    def readSeasonDataMatching(self , pattern):
+        """
+            pattern - glob style pattern on the file name in season/ , ie "201*-data"
+            Returns dict of file name -> data
+        """
+        return self._readDataMatching(self.seasonDir , "seasons" , pattern)
         
     def readTeamData(self , file):
         """
             file - File name in season/ .json will be appended
         """
+        if self.store is not None:
+            return self.store.read("teams" , file)
         fname = os.path.join(self.teamDir , file + ".json")
         return self.readData(fname)
         
@@ -87,17 +395,24 @@ class TBA_Client:
             file - File name in season/ .json will be appended
             data - Python data structure to be written to file (Will be converted to JSON object string)
         """
-        success = False
+        if self.store is not None:
+            return self.store.write("teams" , file , data)
         fname = os.path.join(self.teamDir , file + ".json")
-        with open(fname , 'w') as fp:
-            fp.write(json.dumps(data))
-            success = True
-        return success
+        return self.writeData(fname , data)
+
+    def readTeamDataMatching(self , pattern):
+        """
+            pattern - glob style pattern on the file name in teams/ , ie "frc254-*"
+            Returns dict of file name -> data
+        """
+        return self._readDataMatching(self.teamDir , "teams" , pattern)
         
     def readEventData(self , file):
         """
             file - File name in season/ .json will be appended
         """
+        if self.store is not None:
+            return self.store.read("events" , file)
         fname = os.path.join(self.eventDir , file + ".json")
         return self.readData(fname)
         
@@ -106,12 +421,54 @@ class TBA_Client:
             file - File name in season/ .json will be appended
             data - Python data structure to be written to file (Will be converted to JSON object string)
         """
-        success = False
+        if self.store is not None:
+            return self.store.write("events" , file , data)
         fname = os.path.join(self.eventDir , file + ".json")
-        with open(fname , 'w') as fp:
-            fp.write(json.dumps(data))
-            success = True
-        return success
+        return self.writeData(fname , data)
+
+    def readEventArrays(self , file):
+        """
+            file - File name in events/ .npz will be appended
+            Returns dict of name -> numpy array written by writeEventArrays, None if there is none (or it can't be read)
+        """
+        if self.store is not None:
+            stored = self.store.readBlob("events" , file)
+        else:
+            try:
+                with open(os.path.join(self.eventDir , file + ".npz") , 'rb') as fp:
+                    stored = fp.read()
+            except FileNotFoundError:
+                stored = None
+        if stored is None:
+            return None
+        try:
+            with np.load(io.BytesIO(stored) , allow_pickle = False) as npz:
+                return {name : npz[name] for name in npz.files}
+        except (ValueError , OSError , EOFError , zipfile.BadZipFile):
+            if __debug__:
+                print(file + " failed npz decoding.")
+            return None
+
+    def writeEventArrays(self , file , arrays):
+        """
+            file - File name in events/ .npz will be appended
+            arrays - dict of name -> numpy array, stored in numpy's binary npz format (zip compressed when self.compression is set)
+        """
+        buffer = io.BytesIO()
+        if self.compression is None:
+            np.savez(buffer , **arrays)
+        else:
+            np.savez_compressed(buffer , **arrays)
+        if self.store is not None:
+            return self.store.writeBlob("events" , file , buffer.getvalue())
+        return self._writeFile(os.path.join(self.eventDir , file + ".npz") , buffer.getvalue())
+
+    def readEventDataMatching(self , pattern):
+        """
+            pattern - glob style pattern on the file name in events/ , ie "2018*-matches" for every 2018 match payload
+            Returns dict of file name -> data
+        """
+        return self._readDataMatching(self.eventDir , "events" , pattern)
         
     def makeSmartRequest(self , dataName : str , request : str , validityData : dict , requestingObject : type , cacheRefreshAggression : int , dataMutator = None):
         '''
@@ -121,44 +478,114 @@ class TBA_Client:
             requestingObject - object that is making the request
             cacheRefreshAggression - 0 only saved , 1 check file , 2 check request
             dataMutator - mutates the return data for use, optional
+
+            Concurrent calls for the same dataName make a single fetch, every caller gets the same decoded object back.
+            Only calls that also share request and dataMutator (compared by function code, the endpoint jobs build a new
+            closure per call) are coalesced, a call asking for something else under the same name makes its own fetch
         '''
         out = None
         if cacheRefreshAggression == 0 or cacheRefreshAggression == 1:
             #Read from file
-            if type(requestingObject) == Event:
-                out = self.readEventData(dataName)
-            elif type(requestingObject) == Team:
-                out = self.readTeamData(dataName)
-            elif type(requestingObject) == Season:
-                out = self.readSeasonData(dataName)
+            out = self._readObjectData(requestingObject , dataName)
             #If 0, return
             if cacheRefreshAggression == 0:
                 return out
             if out != None:
                 return out
         
-        request = self.makeRequest(request , validityData[dataName])
-        rawData = None
-        if request == None: #Use saved values
-            if type(requestingObject) == Event:
-                out = self.readEventData(dataName)
-            elif type(requestingObject) == Team:
-                out = self.readTeamData(dataName)
-            elif type(requestingObject) == Season:
-                out = self.readSeasonData(dataName)
-        else: #use values from server
-            if dataMutator == None:
-                out = request[0]
-            else:
-                out = dataMutator(request[0])
-            validityData[dataName] = request[1] #Write the If-Modified-Since header to validation file
-            
-            if type(requestingObject) == Event:
-                self.writeEventData(dataName , out)
-            elif type(requestingObject) == Team:
-                self.writeTeamData(dataName , out)
-            elif type(requestingObject) == Season:
-                self.writeSeasonData(dataName , out)
+        #Callers asking for data that is already being fetched wait for that fetch and share its result
+        key = (self._objectKind(requestingObject) , dataName , request , getattr(dataMutator , "__code__" , dataMutator))
+        with self._inFlightLock:
+            flight = self._inFlight.get(key)
+            isLeader = flight is None
+            if isLeader:
+                flight = Future()
+                self._inFlight[key] = flight
+        if not isLeader:
+            out , lastModified = flight.result()
+            if lastModified is not None:
+                validityData[dataName] = lastModified
+            return out
+
+        try:
+            out , lastModified = self._fetchSmartRequest(dataName , request , validityData , requestingObject , cacheRefreshAggression , dataMutator)
+            flight.set_result((out , lastModified))
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            with self._inFlightLock:
+                del self._inFlight[key]
+        return out
+
+    def _fetchSmartRequest(self , dataName , request , validityData , requestingObject , cacheRefreshAggression , dataMutator):
+        '''
+            Request half of makeSmartRequest, run by a single caller per data name at a time
+
+            out - [data , Last-Modified value the data matches (None if unknown)]
+        '''
+        #Only one thread or process downloads the same data at a time
+        with self.lockData(self._objectKind(requestingObject) , dataName):
+            if cacheRefreshAggression == 1:
+                #Someone else may have saved it while we waited on the lock
+                out = self._readObjectData(requestingObject , dataName)
+                if out != None:
+                    return [out , None]
+
+            request = self.makeRequest(request , validityData[dataName])
+            if request == None: #Use saved values
+                out = self._readObjectData(requestingObject , dataName)
+            else: #use values from server
+                if dataMutator == None:
+                    out = request[0]
+                else:
+                    out = dataMutator(request[0])
+                self._writeObjectData(requestingObject , dataName , out)
+                validityData[dataName] = request[1] #Write the If-Modified-Since header to validation file, only once the data is saved
+        return [out , validityData[dataName]]
+
+    def _objectKind(self , requestingObject):
+        if type(requestingObject) == Event:
+            return "events"
+        elif type(requestingObject) == Team:
+            return "teams"
+        elif type(requestingObject) == Season:
+            return "seasons"
+
+    def _readObjectData(self , requestingObject , dataName):
+        return self._readKindData(self._objectKind(requestingObject) , dataName)
+
+    def _writeObjectData(self , requestingObject , dataName , data):
+        return self._writeKindData(self._objectKind(requestingObject) , dataName , data)
+
+    def fetchMany(self , jobs , maxWorkers = 8):
+        '''
+            jobs - list of (dataName , request , requestingObject) tuples, optionally with a dataMutator as a fourth item
+            maxWorkers - amount of requests allowed in flight at once
+
+            Runs makeSmartRequest for every job concurrently.
+            Validity data is read once per requesting object before the batch and written once after it,
+            cacheRefreshAggression is taken from the requesting object.
+
+            out - list of request results, in the same order as jobs
+        '''
+        validity = {}
+        for job in jobs:
+            if job[2] not in validity:
+                validity[job[2]] = job[2].readValidityData()
+
+        def runJob(job):
+            dataMutator = job[3] if len(job) > 3 else None
+            return self.makeSmartRequest(job[0] , job[1] , validity[job[2]] , job[2] , job[2].cacheRefreshAggression , dataMutator)
+
+        try:
+            with ThreadPoolExecutor(max_workers = maxWorkers) as pool:
+                futures = [pool.submit(runJob , job) for job in jobs]
+                out = [future.result() for future in futures]
+        finally:
+            #Validators of the jobs that did finish are kept even if another job failed
+            for requestingObject in validity:
+                requestingObject.writeValidityData(validity[requestingObject])
         return out
             
     def makeRequest(self , requestTag : str , refreshCode : str = None):
@@ -173,21 +600,54 @@ class TBA_Client:
         req = None
         url = self.apiURL + requestTag
         if refreshCode == None:
-            req = requests.get(url , headers = {"X-TBA-Auth-Key":self.keys.getTBAKey()})
+            req = self._get(url , headers = {"X-TBA-Auth-Key":self.keys.getTBAKey()})
         else:
-            req = requests.get(url , headers = {"X-TBA-Auth-Key":self.keys.getTBAKey() , "If-Modified-Since":refreshCode})
+            req = self._get(url , headers = {"X-TBA-Auth-Key":self.keys.getTBAKey() , "If-Modified-Since":refreshCode})
         #print("{} {}".format(refreshCode , req.headers["Last-Modified"]))
         if req.status_code == 200:
-            return [json.loads(req.text) , req.headers["Last-Modified"]]
+            return [json.loads(req.text) , req.headers.get("Last-Modified")]
         if req.status_code == 304:
             return None
         if req.status_code == 401:
             raise(Exception("API Key Not Valid!"))
         else:
-            raise(Exception("Not valid status code! With Request {}".format(requestTag)))
+            raise(Exception("Not valid status code {}! With Request {}".format(req.status_code , requestTag)))
 
     def URLToJson(self , url: str) -> 'json':
-        return(json.loads(requests.get(url).text))
+        return(json.loads(self._get(url).text))
+
+    def _get(self , url , headers = None):
+        """
+            GET through the pooled session.
+            429 and 5xx responses and connection errors are retried up to self.maxRetries times,
+            sleeping with jittered exponential backoff (or the server's Retry-After) in between.
+            The last response is returned if every retry fails, so callers see the real status code.
+        """
+        attempt = 0
+        while True:
+            self._rateLimiter.wait()
+            req = None
+            try:
+                req = self.session.get(url , headers = headers , timeout = self.timeout)
+            except (requests.ConnectionError , requests.Timeout):
+                if attempt >= self.maxRetries:
+                    raise
+            if req is not None and (req.status_code not in self.RETRY_STATUS_CODES or attempt >= self.maxRetries):
+                return req
+            time.sleep(self._backoffDelay(attempt , req))
+            attempt += 1
+
+    def _backoffDelay(self , attempt , req = None):
+        """
+            Seconds to wait before retry number attempt + 1.
+            Honours a numeric Retry-After header, otherwise full jitter over an exponentially growing window.
+        """
+        if req is not None and "Retry-After" in req.headers:
+            try:
+                return min(float(req.headers["Retry-After"]) , self.maxBackoff)
+            except ValueError:
+                pass
+        return random.uniform(0 , min(self.backoffFactor * (2 ** attempt) , self.maxBackoff))
 
     def storeData(self):
         """
@@ -199,6 +659,23 @@ class TBA_Client:
         
         """
         pass
-    
-    
-    
+
+
+class _Rate_Limiter:
+    """
+        Spaces requests out so no more than requestsPerSecond are started, across all threads using the client.
+    """
+    def __init__(self , requestsPerSecond = None):
+        self.interval = 0 if not requestsPerSecond else 1.0 / requestsPerSecond
+        self._nextTime = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if self.interval == 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            waitTime = self._nextTime - now
+            self._nextTime = max(now , self._nextTime) + self.interval
+        if waitTime > 0:
+            time.sleep(waitTime)
@@ -1,7 +1,8 @@
 import time
 from collections import defaultdict
-from copy import copy
+from contextlib import ExitStack
 from .ObjectShare import ObjectShare
+from .ValiditySession import ValiditySession
 
 _Singleton_TBA_Client = None
 
@@ -13,6 +14,7 @@ class Team:
                 self.eventData
                 self.awardData
                 self.districtData
+                self.yearEventData , self.yearAwardData - year -> that year's events / awards, loaded by getTeams(year = ...)
         '''
         if type(number) == str:
             self.number = int(float(number.replace("frc", "")))
@@ -26,10 +28,14 @@ class Team:
         self.eventData = None
         self.awardData = None
         self.districtData = None
+        self.yearEventData = {}
+        self.yearAwardData = {}
 
         self.getElimEventWins = None
 
-        self._old_validity_data = None
+        self.validity = ValiditySession(lambda : _Singleton_TBA_Client.readTeamData(self.validityFile) ,
+                                        lambda validityData : _Singleton_TBA_Client.writeTeamData(self.validityFile , validityData) ,
+                                        lambda : _Singleton_TBA_Client.lockData("teams" , self.validityFile))
 
     def getTeamData(self):
         if not self.teamData:
@@ -52,22 +58,31 @@ class Team:
         return self.districtData
 
     def getAwardsByYear(self , year):
+        if not self.awardData and year in self.yearAwardData:
+            return list(self.yearAwardData[year] or []) #None when the year's fetch failed or had no data
         out = []
-        for award in self.getAwardData():
+        for award in self.getAwardData() or []:
             if year == award["year"]:
                 out.append(award)
         return out
         
     def getEventsByYear(self, year):
-        out = []
-        for event in self.getEventData():
-            if year == event["year"]:
-                out.append(event)
+        if not self.eventData and year in self.yearEventData:
+            out = list(self.yearEventData[year] or [])
+        else:
+            out = []
+            for event in self.getEventData() or []:
+                if year == event["year"]:
+                    out.append(event)
         out.sort(key = lambda x: time.strptime(x["start_date"], "%Y-%m-%d"))
         return out
         
     def getElimEventWinsByYear(self , year):
-        import frcstat.Event as Event
+        """
+            Returns dict of event key -> playoff matches won at every event of year, see Event.getElimStats
+            Events are shared through getEvent, Season.getElimStats does this for every team at once
+        """
+        from .Event import getEvent
         if not self.getElimEventWins:
             self.getElimEventWins = {}
         if year in self.getElimEventWins:
@@ -75,16 +90,8 @@ class Team:
         self.getElimEventWins[year] = {}
         for event in self.getEventData():
             if year == event["year"]:
-                ev = Event(event["key"])
-                teamMatches = ev.getTeamMatches(self.teamCode)
-                wins = 0
-                for matchKey in teamMatches.keys():
-                    if teamMatches[matchKey]["comp_level"] != "qm":
-                        color = "blue"
-                        if self.teamCode in teamMatches[matchKey]["alliances"]["red"]["team_keys"]:
-                            color = "red"
-                        if color == teamMatches[matchKey]["winning_alliance"]:
-                            wins += 1
+                elimStats = getEvent(event["key"] , self.cacheRefreshAggression).getElimStats()
+                wins = elimStats[self.teamCode]["playoff_wins"] if self.teamCode in elimStats else 0
                 self.getElimEventWins[year][event["key"]] = wins
         return self.getElimEventWins[year]
 
@@ -120,60 +127,60 @@ class Team:
         return None
 
     def readValidityData(self):
-        self._old_validity_data = _Singleton_TBA_Client.dictToDefaultDict(_Singleton_TBA_Client.readTeamData(self.validityFile) , lambda:None)
-        return copy(self._old_validity_data)
+        return self.validity.read()
 
     def writeValidityData(self, validityData):
-        if self._old_validity_data == validityData:
-            return True
-        return _Singleton_TBA_Client.writeTeamData(self.validityFile, validityData)  # Write validity object to file
+        return self.validity.write(validityData)  # Write validity object to file
 
     def loadData(self):
         """
             
         """
 
-        self.loadTeamData()
-        self.loadEventData()
-        self.loadAwardData()
-        self.loadDistrictData()
+        with self.validity: #validity file is written once, after every request
+            jobs = self._endpointJobs()
+            results = _Singleton_TBA_Client.fetchMany(list(jobs.values())) #every endpoint is requested concurrently
+            for attribute , result in zip(jobs , results):
+                setattr(self , attribute , result)
 
-    def loadTeamData(self):
-        validityData = self.readValidityData()
-
-        teamDataName = "{}-data".format(self.teamCode)
-        teamDataRequest = r"team/{}".format(self.teamCode)
-        self.teamData = _Singleton_TBA_Client.makeSmartRequest(teamDataName, teamDataRequest, validityData, self,
-                                                               self.cacheRefreshAggression)
-
-        self.writeValidityData(validityData)
+    def _endpointJobs(self):
+        """
+            fetchMany jobs for every TBA endpoint of this team, keyed by the attribute the result is stored in
+        """
+        jobs = {}
+        jobs["teamData"]     = ("{}-data".format(self.teamCode)      , r"team/{}".format(self.teamCode)           , self)
+        jobs["eventData"]    = ("{}-events".format(self.teamCode)    , r"team/{}/events".format(self.teamCode)    , self)
+        jobs["awardData"]    = ("{}-awards".format(self.teamCode)    , r"team/{}/awards".format(self.teamCode)    , self)
+        jobs["districtData"] = ("{}-districts".format(self.teamCode) , r"team/{}/districts".format(self.teamCode) , self)
+        return jobs
+
+    def _yearEndpointJobs(self , year):
+        """
+            fetchMany jobs for the year scoped endpoints of this team, keyed by the attribute the result is stored in
+        """
+        jobs = {}
+        jobs["yearEventData"] = ("{}-events-{}".format(self.teamCode , year) , r"team/{}/events/{}".format(self.teamCode , year) , self)
+        jobs["yearAwardData"] = ("{}-awards-{}".format(self.teamCode , year) , r"team/{}/awards/{}".format(self.teamCode , year) , self)
+        return jobs
 
-    def loadEventData(self):
+    def _loadEndpoint(self, attribute):
+        job = self._endpointJobs()[attribute]
         validityData = self.readValidityData()
+        setattr(self, attribute, _Singleton_TBA_Client.makeSmartRequest(job[0], job[1], validityData, self,
+                                                                        self.cacheRefreshAggression))
+        self.writeValidityData(validityData)
 
-        teamEventName = "{}-events".format(self.teamCode)  # common name
-        teamEventRequest = r"team/{}/events".format(self.teamCode)
-        self.eventData = _Singleton_TBA_Client.makeSmartRequest(teamEventName, teamEventRequest, validityData, self,
-                                                                self.cacheRefreshAggression)
+    def loadTeamData(self):
+        self._loadEndpoint("teamData")
 
-        self.writeValidityData(validityData)
+    def loadEventData(self):
+        self._loadEndpoint("eventData")
 
     def loadAwardData(self):
-        validityData = self.readValidityData()
-        teamAwardName = "{}-awards".format(self.teamCode)  # common name
-        teamAwardRequest = r"team/{}/awards".format(self.teamCode)
-        self.awardData = _Singleton_TBA_Client.makeSmartRequest(teamAwardName, teamAwardRequest, validityData, self,
-                                                                self.cacheRefreshAggression)
-        self.writeValidityData(validityData)
-
+        self._loadEndpoint("awardData")
 
     def loadDistrictData(self):
-        validityData = self.readValidityData()
-        districtDataName = "{}-districts".format(self.teamCode)  # common name
-        districtDataRequest = r"team/{}/districts".format(self.teamCode)
-        self.districtData = _Singleton_TBA_Client.makeSmartRequest(districtDataName, districtDataRequest, validityData,
-                                                                   self, self.cacheRefreshAggression)
-        self.writeValidityData(validityData)
+        self._loadEndpoint("districtData")
 
 
 
@@ -184,6 +191,51 @@ def getTeam(teamNumber, cacheRefreshAggression = 1):
     return _teamShare.get(teamNumber, cacheRefreshAggression)
 
 
+def getTeams(teamNumbers , year = None , cacheRefreshAggression = 1):
+    """
+        Loads many teams at once, every request of every team is made concurrently (see TBA_Client.fetchMany)
+        The teams are the shared getTeam objects
+
+        year - only loads the team/{key}/events/{year} and team/{key}/awards/{year} endpoints,
+               which getEventsByYear(year) and getAwardsByYear(year) use while the all years data isn't loaded.
+               None loads every endpoint, like Team.loadData
+
+        Returns list of Team, in teamNumbers order
+    """
+    teams = []
+    for teamNumber in teamNumbers:
+        if type(teamNumber) == str:
+            teamNumber = int(float(teamNumber.replace("frc", "")))
+        teams.append(getTeam(teamNumber , cacheRefreshAggression))
+
+    jobs = []
+    targets = [] #(team , attribute) of every job
+    seen = set()
+    for team in teams:
+        if year is None:
+            teamJobs = team._endpointJobs()
+        else:
+            teamJobs = team._yearEndpointJobs(year)
+            if (team.eventData and team.awardData) or (year in team.yearEventData and year in team.yearAwardData):
+                continue
+        for attribute in teamJobs:
+            if (team , attribute) not in seen:
+                seen.add((team , attribute))
+                jobs.append(teamJobs[attribute])
+                targets.append((team , attribute))
+
+    with ExitStack() as stack:
+        for team in set(team for team , attribute in targets):
+            stack.enter_context(team.validity) #validity files are written once, after every request
+        results = _Singleton_TBA_Client.fetchMany(jobs)
+    for (team , attribute) , result in zip(targets , results):
+        if year is None:
+            setattr(team , attribute , result)
+        else:
+            getattr(team , attribute)[year] = result
+    return teams
+
+
 def _Team_Set_TBA_Client(client):
     global _Singleton_TBA_Client
     _Singleton_TBA_Client = client
@@ -0,0 +1,87 @@
+import threading
+from contextlib import nullcontext
+from collections import defaultdict
+from copy import copy
+
+class ValiditySession:
+    """
+        In memory copy of an object's validity file ("<code>-valid"), shared by every endpoint load of that object.
+
+        The file is read once, on first use. writeValidityData style updates only record which requests changed.
+        Outside of a with block the changes are flushed straight away, inside one they are flushed once when the block exits
+        (also when it exits with an exception, so validators of the requests that did finish are kept).
+
+        A flush re-reads the file and only applies the changed requests on top of it,
+        so validators saved in the meantime by other objects or processes are not lost.
+        Payloads are always saved before their validator is recorded, so a crash before a flush only costs a refetch.
+    """
+    def __init__(self , readFunc , writeFunc , lockFunc = None):
+        """
+            readFunc - function returning the stored validity dict (or None)
+            writeFunc - function taking a validity dict and storing it
+            lockFunc - optional function returning a context manager that locks the stored validity dict between
+                       the re-read and the write of a flush, for processes sharing the file
+        """
+        self.readFunc = readFunc
+        self.writeFunc = writeFunc
+        self.lockFunc = lockFunc
+        self._data = None
+        self._dirty = {}
+        self._depth = 0
+        self._lock = threading.RLock()
+
+    def read(self):
+        """
+            Returns a copy of the validity data that can be handed to makeSmartRequest
+        """
+        with self._lock:
+            if self._data is None:
+                self._data = self._load()
+            return copy(self._data)
+
+    def write(self , validityData):
+        """
+            Records every request whose validator differs from what the session holds
+        """
+        with self._lock:
+            if self._data is None:
+                self._data = self._load()
+            for dataName in validityData:
+                if validityData[dataName] != self._data[dataName]:
+                    self._data[dataName] = validityData[dataName]
+                    self._dirty[dataName] = validityData[dataName]
+            if self._depth == 0:
+                return self.flush()
+        return True
+
+    def flush(self):
+        with self._lock:
+            if len(self._dirty) == 0:
+                return True
+            lock = self.lockFunc() if self.lockFunc is not None else nullcontext()
+            with lock:
+                stored = self._load()
+                for dataName in self._dirty:
+                    stored[dataName] = self._dirty[dataName]
+                success = self.writeFunc(dict(stored))
+            self._dirty = {}
+            return success
+
+    def _load(self):
+        out = defaultdict(lambda : None)
+        stored = self.readFunc()
+        if stored:
+            out.update(stored)
+        return out
+
+    def __enter__(self):
+        with self._lock:
+            self._depth += 1
+        return self
+
+    def __exit__(self , excType , excValue , traceback):
+        with self._lock:
+            self._depth -= 1
+            if self._depth == 0:
+                self.flush()
+        return False
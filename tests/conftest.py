@@ -0,0 +1,118 @@
+import json
+import random
+import threading
+import pytest
+import frcstat
+
+
+class FakeResponse:
+    def __init__(self , statusCode , data = None , headers = None):
+        self.status_code = statusCode
+        self.text = json.dumps(data)
+        self.headers = headers or {}
+
+
+class FakeSession:
+    """
+        Stands in for the client's requests.Session, serving routes (request tag -> payload) with Last-Modified validators.
+
+        self.scripted - request tag -> list of responses (or exceptions) handed out first, before the route is served
+        self.calls - every request tag asked for, in order
+        self.delay - optional seconds every request takes, to line up concurrent callers
+    """
+    def __init__(self , apiURL):
+        self.apiURL = apiURL
+        self.routes = {}
+        self.versions = {}
+        self.scripted = {}
+        self.calls = []
+        self.delay = 0
+        self._lock = threading.Lock()
+
+    def setRoute(self , requestTag , data):
+        self.routes[requestTag] = data
+        self.versions[requestTag] = self.versions.get(requestTag , 0) + 1
+
+    def get(self , url , headers = None , timeout = None):
+        requestTag = url[len(self.apiURL):]
+        with self._lock:
+            self.calls.append(requestTag)
+            scripted = self.scripted.get(requestTag)
+            response = scripted.pop(0) if scripted else None
+        if self.delay:
+            threading.Event().wait(self.delay)
+        if isinstance(response , Exception):
+            raise(response)
+        if response is not None:
+            return response
+        if requestTag not in self.routes:
+            return FakeResponse(404)
+        lastModified = "v{}".format(self.versions[requestTag])
+        if (headers or {}).get("If-Modified-Since") == lastModified:
+            return FakeResponse(304)
+        return FakeResponse(200 , self.routes[requestTag] , {"Last-Modified" : lastModified})
+
+
+@pytest.fixture
+def makeClient(tmp_path):
+    """
+        Returns a function building a TBA_Client on a fresh cache directory (unless cacheDir is given), talking to a FakeSession (client.session)
+        instead of TBA. The last client built is the one Event , Team and Season use.
+    """
+    def build(**kwargs):
+        kwargs.setdefault("backoffFactor" , 0)
+        kwargs.setdefault("cacheDir" , str(tmp_path / "cache{}".format(len(list(tmp_path.iterdir())))))
+        client = frcstat.TBA_Client("testkey" , **kwargs)
+        client.session = FakeSession(client.apiURL)
+        frcstat.resetClient(client)
+        return client
+    return build
+
+
+@pytest.fixture
+def client(makeClient):
+    return makeClient()
+
+
+def makeMatches(code , teams , matchAmount , seed = 1 , breakdown = True):
+    """
+        Returns random played qual matches of teams, as TBA's event/{key}/matches returns them
+    """
+    rnd = random.Random(seed)
+    matches = []
+    for number in range(1 , matchAmount + 1):
+        picked = rnd.sample(teams , 6)
+        match = {"key" : "{}_qm{}".format(code , number) , "comp_level" : "qm" , "set_number" : 1 , "match_number" : number ,
+                 "alliances" : {"red" : {"team_keys" : picked[:3] , "score" : rnd.randint(20 , 120)} ,
+                                "blue" : {"team_keys" : picked[3:] , "score" : rnd.randint(20 , 120)}}}
+        if breakdown:
+            match["score_breakdown"] = {color : {"autoPoints" : rnd.randint(0 , 20) , "teleopPoints" : rnd.randint(0 , 80) ,
+                                                 "rp" : rnd.random() > 0.5 , "endgame" : "Park"} for color in ("red" , "blue")}
+        redWon = match["alliances"]["red"]["score"] > match["alliances"]["blue"]["score"]
+        match["winning_alliance"] = "red" if redWon else "blue"
+        matches.append(match)
+    return matches
+
+
+def setEventRoutes(session , code , teams , matches , year = 2019):
+    session.setRoute("event/{}".format(code) , {"key" : code , "year" : year , "event_type" : 0})
+    session.setRoute("event/{}/matches".format(code) , matches)
+    session.setRoute("event/{}/rankings".format(code) , {"rankings" : [{"team_key" : teams[i] , "rank" : i + 1} for i in range(len(teams))]})
+    session.setRoute("event/{}/teams/keys".format(code) , teams)
+    session.setRoute("event/{}/district_points".format(code) , None)
+    session.setRoute("event/{}/awards".format(code) , [])
+    session.setRoute("event/{}/alliances".format(code) , None)
+
+
+@pytest.fixture
+def makeEvent(client):
+    """
+        Returns a function serving a random event through the client's FakeSession and returning its loaded Event
+    """
+    def build(code = "2019tst" , teamAmount = 18 , matchAmount = 30 , seed = 1 , breakdown = True):
+        teams = ["frc{}".format(100 + i) for i in range(teamAmount)]
+        setEventRoutes(client.session , code , teams , makeMatches(code , teams , matchAmount , seed , breakdown))
+        event = frcstat.Event(code , 2)
+        event.loadData()
+        return event
+    return build
@@ -12,8 +12,8 @@ teamAwards = {}
 teamBestOPR = defaultdict(lambda : -1000000)
 savedOPRS = {}
 
-for t in tqdm(a.getTeamList()):
-    fteam = frc.Team(t)
+teams = frc.getTeams(a.getTeamList() , year = 2016) #only the 2016 events and awards, every team at once
+for t , fteam in tqdm(list(zip(a.getTeamList() , teams))):
     teamAwards[t] = len(fteam.getAwardsByYear(2016))
     fevents = fteam.getEventsByYear(2016)
     for event in fevents:
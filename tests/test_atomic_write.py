@@ -0,0 +1,84 @@
+import os
+import threading
+import pytest
+import importlib
+
+TBA_Client_Module = importlib.import_module("frcstat.TBA_Client") #frcstat.TBA_Client is the class once the package is imported
+
+
+def test_write_round_trip(client):
+    data = {"qm1" : {"alliances" : {"red" : {"score" : 10}}} , "unicode" : "é"}
+    assert client.writeEventData("2019abc-matches" , data)
+    assert client.readEventData("2019abc-matches") == data
+    assert client.writeTeamData("frc254-data" , [1 , 2])
+    assert client.readTeamData("frc254-data") == [1 , 2]
+    assert client.writeSeasonData("2019-events" , None)
+    assert client.readSeasonData("2019-events") is None
+
+
+def test_no_temporary_files_are_left(client):
+    for i in range(5):
+        client.writeEventData("2019abc-matches" , {"i" : i})
+    assert os.listdir(client.eventDir) == ["2019abc-matches.json"]
+
+
+def test_failed_replace_keeps_the_old_file(client , monkeypatch):
+    client.writeEventData("2019abc-matches" , {"v" : 1})
+
+    def failingReplace(source , destination):
+        raise(OSError("disk full"))
+
+    monkeypatch.setattr(TBA_Client_Module.os , "replace" , failingReplace)
+    with pytest.raises(OSError):
+        client.writeEventData("2019abc-matches" , {"v" : 2})
+    monkeypatch.undo()
+    assert client.readEventData("2019abc-matches") == {"v" : 1}
+    assert os.listdir(client.eventDir) == ["2019abc-matches.json"]
+
+
+def test_concurrent_writers_never_leave_partial_files(client):
+    payloads = [{"writer" : i , "padding" : "x" * 50000} for i in range(4)]
+    seen = []
+
+    def write(payload):
+        for j in range(10):
+            client.writeEventData("2019abc-matches" , payload)
+
+    def read():
+        for j in range(40):
+            seen.append(client.readEventData("2019abc-matches"))
+
+    client.writeEventData("2019abc-matches" , payloads[0])
+    threads = [threading.Thread(target = write , args = (payload ,)) for payload in payloads] + [threading.Thread(target = read)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(value in payloads for value in seen)
+
+
+@pytest.mark.skipif(TBA_Client_Module.fcntl is None , reason = "no fcntl")
+def test_lock_data_uses_striped_files(client):
+    counter = {"value" : 0 , "inside" : 0 , "overlap" : False}
+
+    def work():
+        for i in range(20):
+            with client.lockData("events" , "2019abc-matches"):
+                counter["inside"] += 1
+                counter["overlap"] |= counter["inside"] > 1
+                counter["value"] += 1
+                counter["inside"] -= 1
+
+    threads = [threading.Thread(target = work) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counter["value"] == 80 and not counter["overlap"]
+
+    for i in range(300):
+        with client.lockData("events" , "2019e{}-matches".format(i)):
+            pass
+    lockFiles = os.listdir(client.lockDir)
+    assert len(lockFiles) <= client.LOCK_STRIPES
+    assert all(name.endswith(".lock") and len(name) == len("000.lock") for name in lockFiles)
@@ -0,0 +1,55 @@
+import os
+import pytest
+from frcstat.Compression import COMPRESSIONS, encodePayload, decodePayload, decompressPayload, getCompression
+
+PAYLOAD = {"matches" : [{"key" : "2019abc_qm{}".format(i) , "score" : i} for i in range(50)] , "text" : "é"}
+
+
+@pytest.mark.parametrize("compression" , COMPRESSIONS)
+def test_round_trip_and_detection(compression):
+    stored = encodePayload(PAYLOAD , compression)
+    assert getCompression(stored) == compression
+    assert decodePayload(stored) == PAYLOAD
+
+
+@pytest.mark.parametrize("data" , [None , 0 , 7.5 , "x" , [] , {} , [{"a" : None}]])
+def test_plain_json_is_never_mistaken_for_compressed(data):
+    stored = encodePayload(data)
+    assert getCompression(stored) is None
+    assert getCompression(stored.decode("utf-8")) is None
+    assert decodePayload(stored) == data
+
+
+def test_compressed_is_smaller():
+    assert len(encodePayload(PAYLOAD , "zlib")) < len(encodePayload(PAYLOAD))
+    assert len(encodePayload(PAYLOAD , "lzma")) < len(encodePayload(PAYLOAD))
+
+
+def test_unknown_compression():
+    with pytest.raises(Exception):
+        encodePayload(PAYLOAD , "brotli")
+
+
+def test_decompress_returns_the_json_text():
+    assert decompressPayload(encodePayload(PAYLOAD , "lzma")) == encodePayload(PAYLOAD)
+
+
+def test_client_reads_a_mixed_cache(makeClient):
+    plainClient = makeClient()
+    plainClient.writeEventData("2019abc-matches" , PAYLOAD)
+    client = makeClient(compression = "zlib" , cacheDir = plainClient.localDataDir)
+    assert client.readEventData("2019abc-matches") == PAYLOAD
+    client.writeEventData("2019abc-awards" , PAYLOAD)
+    with open(os.path.join(client.eventDir , "2019abc-awards.json") , "rb") as fp:
+        assert getCompression(fp.read()) == "zlib"
+    assert plainClient.readEventData("2019abc-awards") == PAYLOAD
+
+
+def test_compact_cache(makeClient):
+    client = makeClient()
+    client.writeEventData("2019abc-matches" , PAYLOAD)
+    client.writeTeamData("frc254-data" , PAYLOAD)
+    converted , bytesBefore , bytesAfter = client.compactCache("lzma")
+    assert converted == 2 and bytesAfter < bytesBefore
+    assert client.readEventData("2019abc-matches") == PAYLOAD
+    assert client.compactCache("lzma")[0] == 0
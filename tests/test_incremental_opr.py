@@ -0,0 +1,154 @@
+import copy
+import numpy as np
+from frcstat.IncrementalOPR import IncrementalOPR
+from .conftest import makeMatches
+
+
+def _fullSolve(teamKeys , matches):
+    """
+        OPRs of matches straight from the least squares system, one row per alliance
+    """
+    lookup = {teamKeys[i] : i for i in range(len(teamKeys))}
+    A = []
+    B = []
+    for match in matches:
+        for color in ("red" , "blue"):
+            row = np.zeros(len(teamKeys))
+            row[[lookup[team] for team in match["alliances"][color]["team_keys"]]] = 1
+            A.append(row)
+            B.append(match["alliances"][color]["score"])
+    return np.linalg.lstsq(np.array(A) , np.array(B) , rcond = None)[0]
+
+
+def _addAll(tracker , matches):
+    for match in matches:
+        tracker.addMatch(match["key"] , match["alliances"]["red"]["team_keys"] , match["alliances"]["blue"]["team_keys"] ,
+                         match["alliances"]["red"]["score"] , match["alliances"]["blue"]["score"])
+
+
+def test_rank_one_updates_match_a_full_solve():
+    teams = ["frc{}".format(i) for i in range(20)]
+    matches = makeMatches("2019tst" , teams , 60)
+    tracker = IncrementalOPR(teams)
+    _addAll(tracker , matches[:40])
+    assert tracker.Ainv is not None
+    assert np.allclose(tracker.getOprs() , _fullSolve(teams , matches[:40]))
+    _addAll(tracker , matches[40:])
+    assert np.allclose(tracker.getOprs() , _fullSolve(teams , matches) , atol = 1e-9)
+
+
+def test_bulk_add_matches_one_at_a_time():
+    teams = ["frc{}".format(i) for i in range(20)]
+    matches = makeMatches("2019tst" , teams , 50)
+    lookup = {teams[i] : i for i in range(len(teams))}
+    red = np.array([[lookup[t] for t in match["alliances"]["red"]["team_keys"]] for match in matches])
+    blue = np.array([[lookup[t] for t in match["alliances"]["blue"]["team_keys"]] for match in matches])
+    bulk = IncrementalOPR(teams)
+    bulk.addMatches([match["key"] for match in matches] , red , blue ,
+                    np.array([match["alliances"]["red"]["score"] for match in matches]) ,
+                    np.array([match["alliances"]["blue"]["score"] for match in matches]))
+    single = IncrementalOPR(teams)
+    _addAll(single , matches)
+    assert np.allclose(bulk.getOprs() , single.getOprs())
+
+
+def test_before_full_rank_only_played_teams_have_oprs():
+    teams = ["frc{}".format(i) for i in range(20)]
+    matches = makeMatches("2019tst" , teams , 3)
+    tracker = IncrementalOPR(teams)
+    _addAll(tracker , matches)
+    played = sorted(set(team for match in matches for color in ("red" , "blue") for team in match["alliances"][color]["team_keys"]))
+    oprs = tracker.getOprs()
+    assert all(np.isnan(oprs[i]) == (teams[i] not in played) for i in range(len(teams)))
+    assert tracker.Ainv is None
+
+
+def test_duplicates_are_skipped_and_new_teams_added():
+    teams = ["frc{}".format(i) for i in range(20)]
+    matches = makeMatches("2019tst" , teams , 40)
+    tracker = IncrementalOPR(teams[:10])
+    _addAll(tracker , matches)
+    assert not tracker.addMatch(matches[0]["key"] , [] , [] , 0 , 0)
+    assert sorted(tracker.teamKeys) == sorted(teams)
+    assert np.allclose(tracker.getOprs() , _fullSolve(tracker.teamKeys , matches) , atol = 1e-9)
+
+
+def test_update_oprs_matches_a_full_solve(makeEvent , client):
+    event = makeEvent(teamAmount = 20 , matchAmount = 30)
+    teams = event.getTeamList()
+    matches = makeMatches("2019tst" , ["frc{}".format(100 + i) for i in range(20)] , 50) #the first 30 are the event's
+    for match in matches[30:]:
+        oprs = event.updateOprs([match])
+    assert np.allclose(oprs , event.getArrayOPRS() , atol = 1e-9)
+    assert np.allclose(oprs , _fullSolve(teams , matches) , atol = 1e-9)
+    assert event.getQualMatchAmount() == 50
+
+
+def test_update_oprs_rebuilds_on_score_corrections(makeEvent):
+    event = makeEvent(teamAmount = 20 , matchAmount = 40)
+    tracker = event._getIncrementalOPR()
+    corrected = copy.deepcopy(event.getMatchInformation("qm3"))
+    corrected["alliances"]["red"]["score"] += 50
+    oprs = event.updateOprs([corrected])
+    assert event._getIncrementalOPR() is not tracker
+    assert np.allclose(oprs , event.getArrayOPRS() , atol = 1e-9)
+
+
+def test_update_oprs_adds_new_teams(makeEvent):
+    event = makeEvent(teamAmount = 20 , matchAmount = 40)
+    match = copy.deepcopy(event.getMatchInformation("qm1"))
+    match["key"] = "2019tst_qm41"
+    match["match_number"] = 41
+    match["alliances"]["blue"]["team_keys"][0] = "frc9999"
+    oprs = event.updateOprs([match])
+    assert event.getTeamList()[-1] == "frc9999"
+    assert event.getLookup()["frc9999"] == len(oprs) - 1
+    assert np.allclose(oprs , event.getArrayOPRS() , atol = 1e-9)
+
+
+def test_refresh_live_oprs(makeEvent , client):
+    event = makeEvent(teamAmount = 20 , matchAmount = 40)
+    teams = event.getTeamList()
+    matches = makeMatches("2019tst" , ["frc{}".format(100 + i) for i in range(20)] , 45)
+    before = event.refreshLiveOprs() #304
+    assert client.session.calls[-1] == "event/2019tst/matches"
+    assert np.allclose(before , event.getArrayOPRS())
+    elim = copy.deepcopy(matches[0])
+    elim.update({"key" : "2019tst_f1m1" , "comp_level" : "f"})
+    client.session.setRoute("event/2019tst/matches" , matches + [elim])
+    oprs = event.refreshLiveOprs()
+    assert "f1m1" in event.getMatchData()
+    assert np.allclose(oprs , _fullSolve(teams , matches) , atol = 1e-9)
+
+
+def test_progression_rows_match_solves_of_each_prefix(makeEvent):
+    event = makeEvent(teamAmount = 20 , matchAmount = 40)
+    matchKeys , progression = event.getOPRProgression()
+    assert matchKeys == ["qm{}".format(i) for i in range(1 , 41)]
+    teams = event.getTeamList()
+    matches = [event.getMatchInformation(matchKey) for matchKey in matchKeys]
+    for count in (2 , 10 , 25 , 40):
+        expected = np.full(len(teams) , np.nan)
+        played = sorted(set(teams.index(team) for match in matches[:count] for color in ("red" , "blue")
+                            for team in match["alliances"][color]["team_keys"]))
+        playedKeys = [teams[i] for i in played]
+        expected[played] = _fullSolve(playedKeys , matches[:count])
+        assert np.allclose(progression[count - 1] , expected , atol = 1e-8 , equal_nan = True)
+    assert np.allclose(progression[-1] , event.getArrayOPRS())
+
+
+def test_progression_of_chosen_prefixes_skips_the_other_solves(makeEvent , monkeypatch):
+    event = makeEvent(teamAmount = 20 , matchAmount = 40)
+    allKeys , allRows = event.getOPRProgression()
+    solves = []
+    originalRefactor = IncrementalOPR.refactor
+
+    def countingRefactor(tracker):
+        solves.append(len(tracker.matchKeys))
+        return originalRefactor(tracker)
+
+    monkeypatch.setattr(IncrementalOPR , "refactor" , countingRefactor)
+    matchKeys , progression = event.getOPRProgression([40 , 5 , 12 , 99])
+    assert matchKeys == [allKeys[4] , allKeys[11] , allKeys[39]]
+    assert np.allclose(progression , allRows[[4 , 11 , 39]] , equal_nan = True)
+    assert set(solves) <= {5 , 12} #only the asked for prefixes that weren't already factored
@@ -0,0 +1,60 @@
+import numpy as np
+from frcstat.MatchTable import MatchTable, RED, BLUE
+
+
+def _match(compLevel , number , red , blue , RS , BS , winner = None , breakdown = None):
+    match = {"comp_level" : compLevel , "set_number" : 1 , "match_number" : number ,
+             "alliances" : {"red" : {"team_keys" : red , "score" : RS} , "blue" : {"team_keys" : blue , "score" : BS}}}
+    if winner is not None:
+        match["winning_alliance"] = winner
+    if breakdown is not None:
+        match["score_breakdown"] = breakdown
+    return match
+
+
+MATCH_DATA = {"qm1" : _match("qm" , 1 , ["frc1" , "frc2" , "frc3"] , ["frc4" , "frc5" , "frc6"] , 50 , 40 , "red" ,
+                             {"red" : {"autoPoints" : 5 , "endgame" : "Park" , "rp" : True , "nested" : {"cargo" : 2}} ,
+                              "blue" : {"autoPoints" : 7 , "endgame" : "None" , "rp" : False , "nested" : {"cargo" : 3}}}) ,
+              "qm2" : _match("qm" , 2 , ["frc4" , "frc1" , "frc9"] , ["frc2" , "frc3" , "frc5"] , 30 , 60 , "blue") ,
+              "f1m1" : _match("f" , 1 , ["frc6" , "frc5" , "frc4"] , ["frc1" , "frc2" , "frc3"] , 70 , 70 , "" ,
+                              {"red" : {"autoPoints" : 1 , "rp" : None} , "blue" : {"autoPoints" : 2 , "rp" : None}})}
+LOOKUP = {"frc{}".format(i) : i - 1 for i in range(1 , 7)}
+
+
+def test_columns():
+    matchTable = MatchTable(MATCH_DATA , LOOKUP)
+    table = matchTable.table
+    assert matchTable.keys == ["qm1" , "qm2" , "f1m1"]
+    assert matchTable.rowIndex == {"qm1" : 0 , "qm2" : 1 , "f1m1" : 2}
+    assert list(table["comp_level"]) == ["qm" , "qm" , "f"]
+    assert list(table["match_number"]) == [1 , 2 , 1]
+    assert list(table["RS"]) == [50 , 30 , 70] and list(table["BS"]) == [40 , 60 , 70]
+    assert list(table["winner"]) == [RED , BLUE , 0]
+    assert [table[station][0] for station in ("B1" , "B2" , "B3" , "R1" , "R2" , "R3")] == [3 , 4 , 5 , 0 , 1 , 2]
+    assert table["R3"][1] == -1 #frc9 isn't in the lookup
+
+
+def test_breakdown_fields():
+    matchTable = MatchTable(MATCH_DATA , LOOKUP)
+    table = matchTable.table
+    assert sorted(matchTable.breakdownFields) == ["score_breakdown_blue_autoPoints" , "score_breakdown_blue_nested_cargo" ,
+                                                  "score_breakdown_red_autoPoints" , "score_breakdown_red_nested_cargo"]
+    assert np.allclose(table["score_breakdown_red_autoPoints"] , [5 , np.nan , 1] , equal_nan = True)
+    assert np.allclose(table["score_breakdown_blue_nested_cargo"] , [3 , np.nan , np.nan] , equal_nan = True)
+
+
+def test_team_index():
+    matchTable = MatchTable(MATCH_DATA , LOOKUP)
+    rows , colors , stations = matchTable.getTeamRows("frc1")
+    assert list(rows) == [0 , 1 , 2]
+    assert list(colors) == [RED , RED , BLUE]
+    assert list(stations) == [1 , 2 , 1]
+    rows , colors , stations = matchTable.getTeamRows("frc9") #indexed even though it isn't in the lookup
+    assert list(rows) == [1] and list(colors) == [RED] and list(stations) == [3]
+    assert len(matchTable.getTeamRows("frc254")[0]) == 0
+
+
+def test_empty_match_data():
+    matchTable = MatchTable({} , LOOKUP)
+    assert len(matchTable.table) == 0
+    assert matchTable.breakdownFields == [] and matchTable.teamIndex == {}
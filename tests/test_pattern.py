@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from frcstat.Event import _Compiled_Pattern, _getCompiledPattern
+
+
+def test_suffixes_are_found():
+    pattern = "B1_O + B2_O + B3_O - R1_D - R2_D - R3_D = BS;R1_O + R2_O + R3_O - B1_D - B2_D - B3_D = RS"
+    assert sorted(_getCompiledPattern(pattern).suffixList) == ["_D" , "_O"]
+    assert _getCompiledPattern(pattern) is _getCompiledPattern(pattern)
+
+
+@pytest.mark.parametrize("pattern" , ["B11 = __import__('os').getcwd()" ,
+                                      "B11 = BS.real" ,
+                                      "B11 = [BS]" ,
+                                      "B11 = BS if RS else 0" ,
+                                      "B11 = BS ** 2" ,
+                                      "B11 + B21"])
+def test_only_arithmetic_is_accepted(pattern):
+    with pytest.raises(Exception):
+        _Compiled_Pattern(pattern , ["1"])
+
+
+def test_variables_cant_multiply_each_other(makeEvent):
+    event = makeEvent()
+    with pytest.raises(Exception , match = "multiplied"):
+        event.scoreMetricFromPattern("B11 * B21 = BS;R11 = RS")
+    with pytest.raises(Exception , match = "divided"):
+        event.scoreMetricFromPattern("B11 / B21 = BS;R11 = RS")
+
+
+def test_evaluate_builds_the_linear_forms(makeEvent):
+    event = makeEvent()
+    compiled = _Compiled_Pattern("2 * B11 + (B21 - B31) / 2 = BS - 3" , ["1"])
+    matchRows , stations = event._getPatternMatches()
+    rows , cols , values , B = compiled.evaluate(event , matchRows , stations , event.getTeamAmount())
+    table = event._getMatchTable().table
+    assert np.allclose(B , table["BS"][matchRows] - 3)
+    A = np.zeros((len(B) , event.getTeamAmount()))
+    np.add.at(A , (rows , cols) , values)
+    expected = np.zeros_like(A)
+    for match in range(len(matchRows)):
+        expected[match , stations["B1"][match]] += 2
+        expected[match , stations["B2"][match]] += 0.5
+        expected[match , stations["B3"][match]] -= 0.5
+    assert np.allclose(A , expected)
+
+
+def test_opr_pattern_matches_array_oprs(makeEvent):
+    event = makeEvent()
+    oprs = event.getArrayOPRS()
+    lookup = event._getLookupDict()
+    for solver in ("dense" , "sparse"):
+        metric = event.scoreMetricFromPattern(solver = solver)
+        assert max(abs(metric[team + "1"] - oprs[lookup[team]]) for team in lookup) < 1e-8
+
+
+def test_breakdown_fields_can_be_used(makeEvent):
+    event = makeEvent()
+    metric = event.scoreMetricFromPattern("B1a + B2a + B3a = score_breakdown_blue_autoPoints;R1a + R2a + R3a = score_breakdown_red_autoPoints")
+    coprs = event.getComponentOPRS()["autoPoints"]
+    lookup = event._getLookupDict()
+    assert max(abs(metric[team + "a"] - coprs[lookup[team]]) for team in lookup) < 1e-8
@@ -0,0 +1,75 @@
+import os
+from frcstat.PayloadCache import PayloadCache
+from frcstat.SQLiteStore import SQLiteStore
+
+
+def test_token_change_is_a_miss():
+    cache = PayloadCache()
+    cache.put("key" , (1 , 10) , {"a" : 1} , 10)
+    assert cache.get("key" , (1 , 10)) == (True , {"a" : 1})
+    assert cache.get("key" , (2 , 10)) == (False , None)
+    assert cache.getStats()["hits"] == 1 and cache.getStats()["misses"] == 1
+
+
+def test_least_recently_used_are_evicted():
+    cache = PayloadCache(maxBytes = 30)
+    cache.put("a" , 0 , "a" , 10)
+    cache.put("b" , 0 , "b" , 10)
+    cache.put("c" , 0 , "c" , 10)
+    cache.get("a" , 0)
+    cache.put("d" , 0 , "d" , 10)
+    assert cache.get("b" , 0)[0] is False
+    assert all(cache.get(key , 0)[0] for key in ("a" , "c" , "d"))
+    assert cache.getStats()["bytes"] == 30
+
+
+def test_oversized_entries_are_not_kept():
+    cache = PayloadCache(maxBytes = 5)
+    cache.put("a" , 0 , "a" , 1)
+    cache.put("a" , 0 , "huge" , 10)
+    assert cache.get("a" , 0) == (False , None)
+    assert cache.getStats()["bytes"] == 0
+
+
+def test_invalidate_and_clear():
+    cache = PayloadCache()
+    cache.put("a" , 0 , "a" , 1)
+    cache.put("b" , 0 , "b" , 1)
+    cache.invalidate("a")
+    assert cache.get("a" , 0)[0] is False
+    cache.clear()
+    assert cache.getStats()["entries"] == 0 and cache.getStats()["bytes"] == 0
+
+
+def test_client_rereads_a_changed_file(client):
+    client.writeEventData("2019abc-matches" , {"v" : 1})
+    first = client.readEventData("2019abc-matches")
+    assert client.readEventData("2019abc-matches") is first #served from the cache
+    #Rewritten behind the client's back, with a different size so the token changes even on coarse mtimes
+    fname = os.path.join(client.eventDir , "2019abc-matches.json")
+    with open(fname , "w") as fp:
+        fp.write('{"v" : 22}')
+    assert client.readEventData("2019abc-matches") == {"v" : 22}
+
+
+def test_sqlite_writes_change_the_token(tmp_path):
+    cache = PayloadCache()
+    store = SQLiteStore(str(tmp_path / "cache.sqlite") , cache)
+    store.write("events" , "2019abc-matches" , {"v" : 1})
+    assert store.read("events" , "2019abc-matches") == {"v" : 1}
+    with store._lock:
+        token = store._token()
+    store.write("events" , "2019abc-data" , {"other" : True})
+    with store._lock:
+        assert store._token() != token
+    store.write("events" , "2019abc-matches" , {"v" : 2})
+    assert store.read("events" , "2019abc-matches") == {"v" : 2}
+
+
+def test_sqlite_sees_writes_from_another_connection(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    store = SQLiteStore(path , PayloadCache())
+    store.write("events" , "2019abc-matches" , {"v" : 1})
+    assert store.read("events" , "2019abc-matches") == {"v" : 1}
+    SQLiteStore(path).write("events" , "2019abc-matches" , {"v" : 2})
+    assert store.read("events" , "2019abc-matches") == {"v" : 2}
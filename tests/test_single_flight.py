@@ -0,0 +1,68 @@
+import threading
+import frcstat
+
+
+def _runConcurrently(functions):
+    results = [None] * len(functions)
+    barrier = threading.Barrier(len(functions))
+
+    def run(i):
+        barrier.wait()
+        results[i] = functions[i]()
+
+    threads = [threading.Thread(target = run , args = (i ,)) for i in range(len(functions))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_calls_make_one_request(client):
+    client.session.setRoute("event/2019abc/matches" , [{"key" : "2019abc_qm1"}])
+    client.session.delay = 0.2
+    events = [frcstat.Event("2019abc" , 2) for i in range(6)]
+
+    def load(event):
+        job = event._endpointJobs()["matchData"]
+        validityData = {job[0] : None}
+        out = client.makeSmartRequest(job[0] , job[1] , validityData , event , 2 , job[3])
+        return out , validityData[job[0]]
+
+    results = _runConcurrently([lambda event = event : load(event) for event in events])
+    assert client.session.calls == ["event/2019abc/matches"]
+    assert all(out is results[0][0] for out , lastModified in results)
+    assert all(lastModified == "v1" for out , lastModified in results)
+    assert results[0][0] == {"qm1" : {"key" : "2019abc_qm1"}}
+
+
+def test_different_mutators_are_not_coalesced(client):
+    client.session.setRoute("event/2019abc/matches" , [{"key" : "2019abc_qm1"}])
+    client.session.delay = 0.2
+    event = frcstat.Event("2019abc" , 2)
+
+    def load(mutator):
+        return client.makeSmartRequest("2019abc-matches" , "event/2019abc/matches" , {"2019abc-matches" : None} , event , 2 , mutator)
+
+    raw , counted = _runConcurrently([lambda : load(None) , lambda : load(lambda matches : len(matches))])
+    assert raw == [{"key" : "2019abc_qm1"}]
+    assert counted == 1
+    assert len(client.session.calls) == 2
+
+
+def test_failures_reach_every_waiter_and_are_not_kept(client):
+    client.session.delay = 0.2
+    event = frcstat.Event("2019abc" , 2)
+
+    def load():
+        try:
+            return client.makeSmartRequest("2019abc-data" , "event/2019abc" , {"2019abc-data" : None} , event , 2)
+        except Exception as e:
+            return e
+
+    results = _runConcurrently([load for i in range(4)])
+    assert all(isinstance(result , Exception) for result in results)
+    assert len(client.session.calls) == 1
+    client.session.delay = 0
+    client.session.setRoute("event/2019abc" , {"key" : "2019abc"})
+    assert load() == {"key" : "2019abc"}
@@ -0,0 +1,64 @@
+import os
+from frcstat.SQLiteStore import SQLiteStore
+
+
+def test_payload_round_trip(tmp_path):
+    store = SQLiteStore(str(tmp_path / "cache.sqlite"))
+    assert store.read("events" , "2019abc-matches") is None
+    store.write("events" , "2019abc-matches" , {"qm1" : {"score" : [1 , 2]}})
+    assert store.read("events" , "2019abc-matches") == {"qm1" : {"score" : [1 , 2]}}
+    store.write("events" , "2019abc-matches" , [])
+    assert store.read("events" , "2019abc-matches") == []
+    assert store.read("teams" , "2019abc-matches") is None
+
+
+def test_validity_is_stored_per_request(tmp_path):
+    store = SQLiteStore(str(tmp_path / "cache.sqlite"))
+    store.write("events" , "2019abc-valid" , {"2019abc-matches" : "v1" , "2019abc-awards" : None})
+    assert store.read("events" , "2019abc-valid") == {"2019abc-matches" : "v1" , "2019abc-awards" : None}
+    rows = store.connection.execute("SELECT dataName FROM validators WHERE owner = ?" , ("2019abc" ,)).fetchall()
+    assert sorted(row[0] for row in rows) == ["2019abc-awards" , "2019abc-matches"]
+    store.write("events" , "2019abc-valid" , {"2019abc-matches" : "v2"})
+    assert store.read("events" , "2019abc-valid") == {"2019abc-matches" : "v2"}
+
+
+def test_read_matching(tmp_path):
+    store = SQLiteStore(str(tmp_path / "cache.sqlite"))
+    store.write("events" , "2018a-matches" , 1)
+    store.write("events" , "2018b-matches" , 2)
+    store.write("events" , "2019a-matches" , 3)
+    store.write("events" , "2018a-valid" , {"2018a-matches" : "v1"})
+    assert store.readMatching("events" , "2018*-matches") == {"2018a-matches" : 1 , "2018b-matches" : 2}
+    assert store.readMatching("events" , "2018a-*") == {"2018a-matches" : 1 , "2018a-valid" : {"2018a-matches" : "v1"}}
+
+
+def test_blobs(tmp_path):
+    store = SQLiteStore(str(tmp_path / "cache.sqlite"))
+    assert store.readBlob("events" , "2019abc-metric") is None
+    store.writeBlob("events" , "2019abc-metric" , b"\x00\x01binary")
+    assert store.readBlob("events" , "2019abc-metric") == b"\x00\x01binary"
+
+
+def test_data_survives_reopening(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    store = SQLiteStore(path , compression = "zlib")
+    store.write("seasons" , "2019-events" , [{"key" : "2019abc"}])
+    store.close()
+    assert SQLiteStore(path).read("seasons" , "2019-events") == [{"key" : "2019abc"}]
+
+
+def test_compact(tmp_path):
+    store = SQLiteStore(str(tmp_path / "cache.sqlite"))
+    payload = [{"key" : "2019abc" , "padding" : "x" * 2000}]
+    store.write("seasons" , "2019-events" , payload)
+    converted , bytesBefore , bytesAfter = store.compact("zlib")
+    assert converted == 1 and bytesAfter < bytesBefore
+    assert store.read("seasons" , "2019-events") == payload
+    assert store.compact("zlib")[0] == 0
+
+
+def test_client_backend(makeClient):
+    client = makeClient(cacheBackend = "sqlite")
+    client.writeEventData("2019abc-matches" , {"qm1" : 1})
+    assert client.readEventData("2019abc-matches") == {"qm1" : 1}
+    assert os.listdir(client.eventDir) == []
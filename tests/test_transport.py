@@ -0,0 +1,58 @@
+import time
+import pytest
+import requests
+from frcstat.TBA_Client import _Rate_Limiter
+from .conftest import FakeResponse
+
+
+def test_retries_5xx_until_success(client):
+    client.session.setRoute("status" , {"ok" : True})
+    client.session.scripted["status"] = [FakeResponse(503) , FakeResponse(500)]
+    data , lastModified = client.makeRequest("status")
+    assert data == {"ok" : True}
+    assert client.session.calls == ["status"] * 3
+
+
+def test_retries_connection_errors(client):
+    client.session.setRoute("status" , {"ok" : True})
+    client.session.scripted["status"] = [requests.ConnectionError("reset")]
+    assert client.makeRequest("status")[0] == {"ok" : True}
+    assert len(client.session.calls) == 2
+
+
+def test_gives_up_after_max_retries(makeClient):
+    client = makeClient(maxRetries = 2)
+    client.session.scripted["status"] = [FakeResponse(502) for i in range(5)]
+    with pytest.raises(Exception , match = "502"):
+        client.makeRequest("status")
+    assert len(client.session.calls) == 3
+
+
+def test_client_errors_are_not_retried(client):
+    with pytest.raises(Exception , match = "404"):
+        client.makeRequest("missing")
+    assert client.session.calls == ["missing"]
+
+
+def test_backoff_honours_retry_after(makeClient):
+    client = makeClient(backoffFactor = 1 , maxBackoff = 4)
+    assert client._backoffDelay(0 , FakeResponse(429 , headers = {"Retry-After" : "2"})) == 2
+    assert client._backoffDelay(0 , FakeResponse(429 , headers = {"Retry-After" : "60"})) == 4
+    for attempt in range(6):
+        assert 0 <= client._backoffDelay(attempt) <= min(2 ** attempt , 4)
+
+
+def test_rate_limiter_spaces_requests():
+    limiter = _Rate_Limiter(50)
+    start = time.monotonic()
+    for i in range(6):
+        limiter.wait()
+    assert time.monotonic() - start >= 5 / 50 * 0.9
+
+
+def test_rate_limiter_disabled():
+    limiter = _Rate_Limiter(None)
+    start = time.monotonic()
+    for i in range(1000):
+        limiter.wait()
+    assert time.monotonic() - start < 0.5
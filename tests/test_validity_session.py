@@ -0,0 +1,95 @@
+from frcstat.ValiditySession import ValiditySession
+
+
+class _Stored_Validity:
+    def __init__(self , data = None):
+        self.data = data
+        self.reads = 0
+        self.writes = []
+
+    def read(self):
+        self.reads += 1
+        return None if self.data is None else dict(self.data)
+
+    def write(self , data):
+        self.data = dict(data)
+        self.writes.append(dict(data))
+        return True
+
+
+def test_file_is_read_once():
+    stored = _Stored_Validity({"a" : "v1"})
+    session = ValiditySession(stored.read , stored.write)
+    assert session.read()["a"] == "v1"
+    assert session.read()["missing"] is None
+    assert stored.reads == 1
+
+
+def test_writes_outside_a_block_flush_immediately():
+    stored = _Stored_Validity()
+    session = ValiditySession(stored.read , stored.write)
+    validityData = session.read()
+    validityData["a"] = "v1"
+    session.write(validityData)
+    assert stored.data == {"a" : "v1"}
+    session.write(validityData) #nothing changed
+    assert len(stored.writes) == 1
+
+
+def test_writes_inside_a_block_are_coalesced():
+    stored = _Stored_Validity()
+    session = ValiditySession(stored.read , stored.write)
+    with session:
+        for name in ("a" , "b" , "c"):
+            validityData = session.read()
+            validityData[name] = "v1"
+            session.write(validityData)
+        assert stored.writes == []
+    assert stored.writes == [{"a" : "v1" , "b" : "v1" , "c" : "v1"}]
+
+
+def test_flush_keeps_validators_saved_by_others():
+    stored = _Stored_Validity({"a" : "v1"})
+    session = ValiditySession(stored.read , stored.write)
+    with session:
+        validityData = session.read()
+        stored.data["b"] = "other" #another process saved a validator meanwhile
+        validityData["a"] = "v2"
+        session.write(validityData)
+    assert stored.data == {"a" : "v2" , "b" : "other"}
+
+
+def test_flush_on_exception():
+    stored = _Stored_Validity()
+    session = ValiditySession(stored.read , stored.write)
+    try:
+        with session:
+            validityData = session.read()
+            validityData["a"] = "v1"
+            session.write(validityData)
+            raise(ValueError("request failed"))
+    except ValueError:
+        pass
+    assert stored.data == {"a" : "v1"}
+
+
+def test_flush_takes_the_lock():
+    stored = _Stored_Validity()
+    events = []
+
+    class _Lock:
+        def __enter__(self):
+            events.append("lock")
+
+        def __exit__(self , *args):
+            events.append("unlock")
+
+    def write(data):
+        events.append("write")
+        return stored.write(data)
+
+    session = ValiditySession(stored.read , write , lambda : _Lock())
+    validityData = session.read()
+    validityData["a"] = "v1"
+    session.write(validityData)
+    assert events == ["lock" , "write" , "unlock"]